@@ -1,7 +1,7 @@
-import sys
-
+from array import array
 from dataclasses import dataclass
-from typing import List, Tuple, Optional, Iterable
+from heapq import heappush, heappop
+from typing import Dict, List, Set, Tuple, Iterable, Optional
 
 """
 REFERENCES:
@@ -18,7 +18,7 @@ class Node:
     icon: str = "░"
 
     def __hash__(self):
-        return hash(f"{self.x},{self.y}")
+        return hash((self.x, self.y))
 
     def __eq__(self, other):
         return self.x == other.x and self.y == other.y
@@ -27,10 +27,152 @@ class Node:
         return self.icon
 
 
-class Graph:
+class NavGrid:
+    """
+    The navigation grid `find_path` searches:  a flat obstacle bitmap indexed by `x * cols + y`.
+
+    It is meant to be long-lived -- cells are blocked/unblocked as obstacles come and go, and
+    every change is recorded as a dirty cell for anything that caches derived data (see `track_changes`).
+    """
+    rows: int
+    cols: int
+    obstacles: bytearray
+    # Cell index -> number of impassable obstacles on it (several can share a tile)
+    blockers: Dict[int, int]
+    # Cost of stepping onto each cell -- None while every step costs 1 (see `terrain.TerrainLayer`)
+    costs: Optional[bytearray]
+    # Bumped on every change to the bitmap or the costs
+    version: int
+    _dirty_sets: List[Set[Tuple[int, int]]]
+
+    def __init__(self, rows: int, cols: int, obstacles: Optional[bytearray] = None,
+                 costs: Optional[bytearray] = None) -> None:
+        """
+        `obstacles` (and `costs`) let the grid read existing buffers in place, e.g. ones in shared memory
+        """
+        self.rows = rows
+        self.cols = cols
+        self.obstacles = obstacles if obstacles is not None else bytearray(rows * cols)
+        self.costs = costs
+        self.blockers = {}
+        self.version = 0
+        self._dirty_sets = []
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.rows and 0 <= y < self.cols
+
+    def is_blocked(self, x: int, y: int) -> bool:
+        return self.in_bounds(x, y) and self.obstacles[x * self.cols + y] == 1
+
+    def track_changes(self) -> Set[Tuple[int, int]]:
+        """
+        Returns a set that every changed cell gets added to from now on.
+        The owner is responsible for clearing it once it has dealt with the changes.
+        """
+        dirty: Set[Tuple[int, int]] = set()
+        self._dirty_sets.append(dirty)
+        return dirty
+
+    def _mark_dirty(self, x: int, y: int) -> None:
+        self.version += 1
+        for dirty in self._dirty_sets:
+            dirty.add((x, y))
+
+    def set_obstacle(self, x: int, y: int, obstacle: bool = True) -> None:
+        idx = x * self.cols + y
+        if self.obstacles[idx] != obstacle:
+            self.obstacles[idx] = obstacle
+            self._mark_dirty(x, y)
+
+    def step_cost(self, idx: int) -> int:
+        """Cost of stepping onto the cell at index `idx`"""
+        return self.costs[idx] if self.costs is not None else 1
+
+    def set_cost(self, x: int, y: int, cost: int) -> None:
+        idx = x * self.cols + y
+        if self.costs is None:
+            if cost == 1:
+                return
+            self.costs = bytearray(b"\x01") * (self.rows * self.cols)
+        if self.costs[idx] != cost:
+            self.costs[idx] = cost
+            self._mark_dirty(x, y)
+
+    def block(self, x: int, y: int) -> None:
+        """Adds one impassable obstacle to the cell"""
+        if not self.in_bounds(x, y):
+            return
+        idx = x * self.cols + y
+        self.blockers[idx] = self.blockers.get(idx, 0) + 1
+        self.set_obstacle(x, y, True)
+
+    def unblock(self, x: int, y: int) -> None:
+        """Removes one impassable obstacle from the cell; it opens up once none are left"""
+        idx = x * self.cols + y
+        if idx not in self.blockers or not self.in_bounds(x, y):
+            return
+        self.blockers[idx] -= 1
+        if not self.blockers[idx]:
+            del self.blockers[idx]
+            self.set_obstacle(x, y, False)
+
+    def blocked_cells(self) -> Set[Tuple[int, int]]:
+        return {divmod(idx, self.cols) for idx in self.blockers}
+
+
+class Reachability:
+    """
+    Connected components of a nav grid, discovered for free by failed searches:  a search that
+    runs out of nodes has visited exactly the component its start is in.  Once a component is
+    known, any target outside it is unreachable without searching again.
+    Everything is forgotten whenever the nav grid changes.
+    """
+    nav: NavGrid
+    labels: Optional[array]
+    version: int
+    next_label: int
+
+    def __init__(self, nav: NavGrid) -> None:
+        self.nav = nav
+        self.labels = None
+        self.version = nav.version
+        self.next_label = 1
+
+    def _current(self) -> Optional[array]:
+        if self.version != self.nav.version:
+            self.labels = None
+            self.version = self.nav.version
+        return self.labels
+
+    def record(self, closed: Iterable[int]) -> None:
+        """Labels the cells of an exhausted search as one component"""
+        labels = self._current()
+        if labels is None:
+            labels = self.labels = array("i", [0]) * (self.nav.rows * self.nav.cols)
+        label = self.next_label
+        self.next_label += 1
+        for idx in closed:
+            labels[idx] = label
+
+    def unreachable(self, start_x: int, start_y: int, end_x: int, end_y: int) -> bool:
+        """True if (start) is known to be in a different component from (end)"""
+        labels = self._current()
+        if labels is None or not (self.nav.in_bounds(start_x, start_y) and self.nav.in_bounds(end_x, end_y)):
+            return False
+        cols = self.nav.cols
+        start_label, end_label = labels[start_x * cols + start_y], labels[end_x * cols + end_y]
+        # A labelled component is complete, so a target it doesn't contain can't be reached from it
+        return (start_label or end_label) != 0 and start_label != end_label
+
+
+class Graph(NavGrid):
+    """
+    A `NavGrid` with a `Node` per cell -- the nodes carry the icons used to draw the board.
+    """
     grid: List[List[Node]]
 
     def __init__(self, rows: int, cols: int) -> None:
+        super().__init__(rows, cols)
         self.grid = []
         for r in range(rows):
             row = []
@@ -38,6 +180,12 @@ class Graph:
                 row.append(Node(x=r, y=c))
             self.grid.append(row)
 
+    def set_obstacle(self, x: int, y: int, obstacle: bool = True) -> None:
+        node = self.grid[x][y]
+        node.obstacle = obstacle
+        node.icon = "█" if obstacle else "░"
+        super().set_obstacle(x, y, obstacle)
+
     def neighbors(self, node: Node) -> Iterable[Node]:
         """Provides a generator of valid cardinal direction neighbors"""
         for r, c in [(node.x, node.y - 1), (node.x + 1, node.y), (node.x, node.y + 1), (node.x - 1, node.y)]:
@@ -49,8 +197,8 @@ class Graph:
                     continue
 
     def cost(self, start: Node, end: Node) -> int:
-        """TODO:  CHANGE THIS EVENTUALLY TO INCLUDE WEIGHTS FOR MOVEMENT"""
-        return 999 if end.obstacle else 1
+        """Cost of stepping from `start` onto `end` -- the terrain's step cost there"""
+        return 999 if end.obstacle else self.step_cost(end.x * self.cols + end.y)
 
     def as_node_path(self, path: List[Tuple[int, int]]) -> List[Node]:
         return [self.grid[n[0]][n[1]] for n in path]
@@ -66,24 +214,6 @@ class Graph:
         return rep
 
 
-class PriorityQueue:
-    queue: List[Tuple[Node, int]] = []
-
-    def push(self, item: Node, priority: int):
-        self.queue.append((item, priority))
-        self.queue.sort(key=lambda x: x[1], reverse=True)
-
-    def pop(self) -> Optional[Node]:
-        last = self.queue.pop()
-        return last[0] if last else None
-
-    def clear(self) -> None:
-        self.queue = []
-
-    def empty(self) -> bool:
-        return self.queue == []
-
-
 def heuristic(goal: Node, current: Node) -> int:
     """
     Heuristic function for search algorithm to bias in the direction of the goal
@@ -92,39 +222,143 @@ def heuristic(goal: Node, current: Node) -> int:
     return abs(goal.x - current.x) + abs(goal.y - current.y)
 
 
-def find_path(graph: Graph, start_x: int, start_y: int, end_x: int, end_y: int) -> List[Tuple[int, int]]:
+class PathSearch:
+    """
+    A* Pathfinding Algorithm over the graph's flat obstacle bitmap.
+    Nodes are integer indices (`x * cols + y`), and the open set is a binary heap.
+
+    The search can be run a limited number of expansions at a time (see `run`) and resumed
+    later, so one long search doesn't have to be finished in a single tick.
+
+    Its g-costs, parents and closed set are a dict, a dict and a set rather than flat per-cell
+    arrays.  Flat arrays make one full search on a 1024x1024 map about 1.2x faster, but every
+    search in flight holds ~9 MiB of them -- and with the budget split round-robin, every queued
+    search is in flight.  On the 1024x1024 / 100k-entity benchmark that's 2.7 GiB peak and ~3x
+    slower ticks (allocating them), against ~200 MiB with the sparse containers.
+    """
+    graph: NavGrid
+    start: int
+    end: int
+    done: bool
+    # True once the search ran out of nodes without reaching the end -- `closed` is then
+    # exactly the set of cells reachable from the start
+    exhausted: bool
+    path: List[Tuple[int, int]]
+    expansions: int
+    # Set once the nav grid changed somewhere the search already looked -- what it found may be out of date
+    stale: bool
+
+    def __init__(self, graph: NavGrid, start_x: int, start_y: int, end_x: int, end_y: int) -> None:
+        self.graph = graph
+        self.stale = False
+        self.end_x, self.end_y = end_x, end_y
+        self.path = []
+        self.expansions = 0
+        self.exhausted = False
+        cols = graph.cols
+        if not (graph.in_bounds(start_x, start_y) and graph.in_bounds(end_x, end_y)) or graph.is_blocked(end_x, end_y):
+            # FATAL:  The goal can never be reached -- no need to flood the map to find that out
+            self.done = True
+            return
+        self.done = False
+        self.start = start_x * cols + start_y
+        self.end = end_x * cols + end_y
+        # Sparse, so a search only costs memory for the cells it actually reaches -- a queue of
+        # searches waiting on their share of the budget stays cheap even on huge maps
+        self.cost_so_far = {self.start: 0}
+        self.came_from = {}
+        self.closed = set()
+        # Entries are (priority, tiebreak, node); the decreasing tiebreak pops the newest of equal
+        # priorities first, the same order the old sorted-list queue used
+        self.frontier = [(0, 0, self.start)]
+        self.pushes = 0
+
+    def run(self, budget: Optional[int] = None) -> int:
+        """
+        Expands up to `budget` nodes (all of them if None) and returns how many were expanded.
+        Check `done` afterwards to see whether the search finished.
+        """
+        if self.done:
+            return 0
+        rows, cols, obstacles, costs = self.graph.rows, self.graph.cols, self.graph.obstacles, self.graph.costs
+        cost_so_far, came_from, closed, frontier = self.cost_so_far, self.came_from, self.closed, self.frontier
+        end, end_x, end_y = self.end, self.end_x, self.end_y
+        pushes = self.pushes
+        expansions = 0
+        while frontier:
+            if budget is not None and expansions >= budget:
+                break
+            _, _, current = heappop(frontier)
+            if current in closed:
+                continue
+            closed.add(current)
+            expansions += 1
+            if current == end:
+                break
+            x, y = divmod(current, cols)
+            current_cost = cost_so_far[current]
+            new_cost = current_cost + 1
+            # Cardinal neighbors, in the same order as `Graph.neighbors`
+            for nx, ny in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+                if nx < 0 or ny < 0 or nx >= rows or ny >= cols:
+                    continue
+                next = nx * cols + ny
+                if obstacles[next] or next in closed:
+                    continue
+                if costs is not None:
+                    new_cost = current_cost + costs[next]
+                old_cost = cost_so_far.get(next)
+                if old_cost is None or new_cost < old_cost:
+                    cost_so_far[next] = new_cost
+                    came_from[next] = current
+                    pushes += 1
+                    heappush(frontier, (new_cost + abs(end_x - nx) + abs(end_y - ny), -pushes, next))
+        self.pushes = pushes
+        self.expansions += expansions
+        if end in closed:
+            self.done = True
+            self.path = self._reconstruct()
+        elif not frontier:
+            # FATAL:  No path to the end goal (entity or goal is boxed in!)
+            self.done = True
+            self.exhausted = True
+        return expansions
+
+    def affected_by(self, cells: Iterable[Tuple[int, int]]) -> bool:
+        """
+        True if any of the changed cells is one the search reached, or borders one it expanded
+        (a cell that opened up there is a way out the search never saw).  Changes anywhere else
+        can't alter what it found.
+        """
+        if self.done:
+            return False
+        rows, cols, reached, closed = self.graph.rows, self.graph.cols, self.cost_so_far, self.closed
+        for x, y in cells:
+            if x * cols + y in reached:
+                return True
+            for nx, ny in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+                if 0 <= nx < rows and 0 <= ny < cols and nx * cols + ny in closed:
+                    return True
+        return False
+
+    def _reconstruct(self) -> List[Tuple[int, int]]:
+        cols, came_from = self.graph.cols, self.came_from
+        path: List[Tuple[int, int]] = [(self.end_x, self.end_y)]
+        next = came_from.get(self.end)
+        while next is not None and next != self.start:
+            path.append(divmod(next, cols))
+            next = came_from[next]
+        path.reverse()
+        return path
+
+
+def search(graph: NavGrid, start_x: int, start_y: int, end_x: int, end_y: int) -> Tuple[List[Tuple[int, int]], int]:
+    """Runs a whole A* search; returns the path and the number of nodes expanded to find it"""
+    path_search = PathSearch(graph, start_x, start_y, end_x, end_y)
+    path_search.run()
+    return path_search.path, path_search.expansions
+
+
+def find_path(graph: NavGrid, start_x: int, start_y: int, end_x: int, end_y: int) -> List[Tuple[int, int]]:
     """A* Pathfinding Algorithm"""
-    for row in graph.grid:
-        for node in row:
-            node.icon = "█" if node.obstacle else node.icon
-    start = Node(x=start_x, y=start_y)
-    end = Node(x=end_x, y=end_y)
-    frontier = PriorityQueue()
-    frontier.clear()
-    frontier.push(start, 0)
-    came_from = dict()
-    came_from[start] = None
-    cost_so_far = dict()
-    cost_so_far[start] = 0
-    while not frontier.empty():
-        current = frontier.pop()
-        if current == end:
-            break
-        for next in graph.neighbors(current):
-            new_cost = cost_so_far[current] + graph.cost(current, next)
-            if next not in cost_so_far or new_cost < cost_so_far[next]:
-                cost_so_far[next] = new_cost
-                priority = new_cost + heuristic(end, next)
-                frontier.push(next, priority)
-                came_from[next] = current
-    path: List[Tuple[int, int]] = [(end.x, end.y)]
-    try:
-        next = came_from[end]
-    except KeyError:
-        # FATAL:  No path to the end goal (entity or goal is boxed in!)
-        return []
-    while next and next != start:
-        path.append((next.x, next.y))
-        next = came_from[next]
-    path.reverse()
-    return path
+    return search(graph, start_x, start_y, end_x, end_y)[0]
@@ -0,0 +1,55 @@
+from typing import Dict, List, Tuple
+
+"""
+Which parts of the map are awake.
+
+The map is split into chunks (the spatial index's cells).  A chunk wakes up whenever something
+happens in it -- an entity moves, a component changes, a processor pokes it -- and stays awake for
+`linger` more ticks.  Chunks where nothing happened for longer than that sleep, and processors that
+iterate with `World.get_active_components` skip the entities in them entirely.
+"""
+
+Coords = Tuple[int, int]
+
+
+class ActivityMap:
+    chunk_size: int
+    # Ticks a chunk stays awake after its last activity
+    linger: int
+    tick: int
+    # Chunk -> the last tick it's awake for
+    awake_until: Dict[Coords, int]
+
+    def __init__(self, chunk_size: int, linger: int = 2) -> None:
+        self.chunk_size = chunk_size
+        self.linger = linger
+        self.tick = 0
+        self.awake_until = {}
+
+    def chunk_of(self, x: int, y: int) -> Coords:
+        return x // self.chunk_size, y // self.chunk_size
+
+    def wake(self, x: int, y: int, neighbours: bool = False) -> None:
+        """Wakes the chunk holding (x, y) -- and the 8 around it with `neighbours`"""
+        cx, cy = self.chunk_of(x, y)
+        until = self.tick + self.linger
+        if not neighbours:
+            self.awake_until[(cx, cy)] = until
+            return
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                self.awake_until[(cx + dx, cy + dy)] = until
+
+    def is_awake(self, x: int, y: int) -> bool:
+        return self.awake_until.get(self.chunk_of(x, y), -1) >= self.tick
+
+    def active(self) -> List[Coords]:
+        """The chunks awake this tick (chunks that fell asleep are dropped along the way)"""
+        tick = self.tick
+        asleep = [chunk for chunk, until in self.awake_until.items() if until < tick]
+        for chunk in asleep:
+            del self.awake_until[chunk]
+        return list(self.awake_until)
+
+    def advance(self) -> None:
+        self.tick += 1
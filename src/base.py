@@ -1,8 +1,11 @@
 from abc import abstractmethod
 from enum import Enum, IntEnum, auto
-from typing import Any, TypeVar
+from typing import Any, Tuple, TypeVar
 
+# An entity is a handle:  its slot index in the low 32 bits, and the slot's generation above that
 Entity = int
+INDEX_BITS = 32
+INDEX_MASK = (1 << INDEX_BITS) - 1
 C = TypeVar('C')
 MAP_WIDTH = 15
 MAP_HEIGHT = 15
@@ -24,6 +27,10 @@ class Task(IntEnum):
 class Processor:
     priority: int
     world: Any
+    # The component types this processor reads and writes, so `World` knows which processors can run
+    # side by side.  A processor that declares neither is assumed to conflict with everything.
+    reads: Tuple[type, ...] = ()
+    writes: Tuple[type, ...] = ()
 
     def __init__(self, priority, world):
         self.priority = priority
@@ -0,0 +1,95 @@
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from components import *
+from registry import component_type, describe
+
+"""
+Memory benchmark:  bytes per entity for the components of `Dorf.init` and of a sock, built with the
+slotted component classes ("slots") and with the plain dataclasses they were made from ("dict").
+
+    python -m benchmarks.memory [--count N] [--types]
+
+Only the component objects are counted (and what they own, e.g. an `Inventory`'s contents) --
+not the storage or query bookkeeping, which is the same for both layouts.
+"""
+
+
+def _dorf(of: Callable[[type], type], i: int) -> List:
+    # The same components as `Dorf.init`
+    return [
+        of(Name)(name=f"Dorf {i}"),
+        of(Position)(i % 64, i // 64),
+        of(Movement)(),
+        of(Inventory)(),
+        of(MaxCarry)(max_weight=5),
+        of(Tasked)(),
+        of(Display)(icon="☺"),
+        of(Debug)(),
+    ]
+
+
+def _sock(of: Callable[[type], type], i: int) -> List:
+    # The same components as a `SOCK` prefab entity
+    return [
+        of(Position)(i % 64, i // 64),
+        of(Name)(name=f"Sock {i}"),
+        of(Weight)(),
+        of(Stockable)(),
+        of(Display)(icon="s"),
+    ]
+
+
+ENTITIES: Dict[str, Callable[[Callable[[type], type], int], List]] = {"dorf": _dorf, "sock": _sock}
+LAYOUTS: Dict[str, Callable[[type], type]] = {
+    "dict": lambda cls: component_type(cls).plain,
+    "slots": lambda cls: cls,
+}
+
+
+def bytes_per_entity(make: Callable[[Callable[[type], type], int], List], of: Callable[[type], type],
+                     count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entities = [make(of, i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Minus the outer list, and each entity's own list of components
+    overhead = sum(map(sys.getsizeof, entities)) + sys.getsizeof(entities)
+    return (after - before - overhead) / count
+
+
+def read_time(of: Callable[[type], type], count: int) -> float:
+    """Nanoseconds per `position.x` read"""
+    positions = [of(Position)(i, i) for i in range(count)]
+    start = time.perf_counter()
+    total = 0
+    for position in positions:
+        total += position.x
+    return (time.perf_counter() - start) / count * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes per entity with slotted vs plain component classes")
+    parser.add_argument("--count", type=int, default=100_000, help="Entities built per measurement")
+    parser.add_argument("--types", action="store_true", help="Also list every registered component type")
+    args = parser.parse_args()
+    if args.types:
+        print(describe())
+        print()
+    print(f"{'entity':<8}" + "".join(f"{layout:>12}" for layout in LAYOUTS) + f"{'saved':>9}")
+    for name, make in ENTITIES.items():
+        sizes = [bytes_per_entity(make, of, args.count) for of in LAYOUTS.values()]
+        saved = 1 - sizes[-1] / sizes[0]
+        print(f"{name:<8}" + "".join(f"{size:>10.0f} B" for size in sizes) + f"{saved:>9.0%}")
+    reads = [read_time(of, args.count) for of in LAYOUTS.values()]
+    print(f"{'x read':<8}" + "".join(f"{ns:>9.1f} ns" for ns in reads))
+
+
+if __name__ == "__main__":
+    main()
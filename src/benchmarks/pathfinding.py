@@ -0,0 +1,123 @@
+import argparse
+import time
+from random import Random
+from typing import List, Tuple, Optional, Dict
+
+from a_star import Graph, Node, heuristic, search
+
+"""
+Pathfinding benchmark:  node expansions per second of `a_star.find_path` against the
+original sorted-list implementation (kept below as `legacy_find_path`).
+
+    python -m benchmarks.pathfinding [--sizes 256 1024] [--density 0.2] [--legacy-limit 20000]
+"""
+
+
+class LegacyPriorityQueue:
+    """The original queue:  re-sorts the whole list on every push"""
+    queue: List[Tuple[Node, int]] = []
+
+    def push(self, item: Node, priority: int):
+        self.queue.append((item, priority))
+        self.queue.sort(key=lambda x: x[1], reverse=True)
+
+    def pop(self) -> Optional[Node]:
+        last = self.queue.pop()
+        return last[0] if last else None
+
+    def clear(self) -> None:
+        self.queue = []
+
+    def empty(self) -> bool:
+        return self.queue == []
+
+
+class LegacyNode(Node):
+    def __hash__(self):
+        return hash(f"{self.x},{self.y}")
+
+
+def legacy_find_path(graph: Graph, start_x: int, start_y: int, end_x: int, end_y: int,
+                     limit: Optional[int] = None) -> Tuple[List[Tuple[int, int]], int]:
+    """
+    The original A* loop, counting expansions.  Gives up after `limit` expansions, since it
+    can't finish large maps in a reasonable time.
+    """
+    start = LegacyNode(x=start_x, y=start_y)
+    end = LegacyNode(x=end_x, y=end_y)
+    frontier = LegacyPriorityQueue()
+    frontier.clear()
+    frontier.push(start, 0)
+    came_from = {start: None}
+    cost_so_far = {start: 0}
+    expansions = 0
+    while not frontier.empty():
+        current = frontier.pop()
+        expansions += 1
+        if current == end or (limit and expansions >= limit):
+            break
+        for next in graph.neighbors(current):
+            next = LegacyNode(x=next.x, y=next.y, obstacle=next.obstacle)
+            new_cost = cost_so_far[current] + graph.cost(current, next)
+            if next not in cost_so_far or new_cost < cost_so_far[next]:
+                cost_so_far[next] = new_cost
+                frontier.push(next, new_cost + heuristic(end, next))
+                came_from[next] = current
+    if end not in came_from:
+        return [], expansions
+    path: List[Tuple[int, int]] = [(end.x, end.y)]
+    next = came_from[end]
+    while next and next != start:
+        path.append((next.x, next.y))
+        next = came_from[next]
+    path.reverse()
+    return path, expansions
+
+
+def build_map(size: int, density: float, seed: int) -> Graph:
+    """A square map with randomly scattered walls; the opposite corners are always open"""
+    rng = Random(seed)
+    graph = Graph(size, size)
+    for x in range(size):
+        for y in range(size):
+            if rng.random() < density and (x, y) not in ((0, 0), (size - 1, size - 1)):
+                graph.set_obstacle(x, y)
+    return graph
+
+
+def run(size: int, density: float = 0.2, seed: int = 0, legacy_limit: int = 20000) -> Dict[str, float]:
+    graph = build_map(size, density, seed)
+    end = size - 1
+    results: Dict[str, float] = {"size": size}
+    t = time.perf_counter()
+    path, expansions = search(graph, 0, 0, end, end)
+    elapsed = time.perf_counter() - t
+    results.update(
+        heap_expansions=expansions, heap_seconds=elapsed, heap_rate=expansions / elapsed, path_length=len(path)
+    )
+    t = time.perf_counter()
+    _, expansions = legacy_find_path(graph, 0, 0, end, end, limit=legacy_limit)
+    elapsed = time.perf_counter() - t
+    results.update(legacy_expansions=expansions, legacy_seconds=elapsed, legacy_rate=expansions / elapsed)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="A* expansions/sec: binary heap vs. the original sorted list")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 1024])
+    parser.add_argument("--density", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--legacy-limit", type=int, default=20000,
+                        help="Stop the original implementation after this many expansions")
+    args = parser.parse_args()
+    print(f"{'map':>11} {'heap exp/s':>12} {'legacy exp/s':>13} {'speedup':>8}  (heap: expansions, path length)")
+    for size in args.sizes:
+        r = run(size, args.density, args.seed, args.legacy_limit)
+        print(
+            f"{size:>5}x{size:<5} {r['heap_rate']:>12,.0f} {r['legacy_rate']:>13,.0f} "
+            f"{r['heap_rate'] / r['legacy_rate']:>7.1f}x  ({r['heap_expansions']:,}, {r['path_length']:,})"
+        )
+
+
+if __name__ == "__main__":
+    main()
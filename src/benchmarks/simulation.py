@@ -0,0 +1,243 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from statistics import median
+from typing import Callable, Dict, List, Optional
+
+from world import World
+from components import *
+from scenario import populate, add_processors
+from storage import DictStorage, ArchetypeStorage
+
+"""
+Simulation benchmark:  seeded worlds from `scenario.populate`, scaled from the 15x15 demo map up to
+2048x2048 and 100k entities.  Each processor is timed on its own every tick, and the `World` query
+primitives are timed in isolation on the populated world.
+
+Results are written as JSON, so runs from two commits can be compared:
+
+    python -m benchmarks.simulation --out before.json
+    python -m benchmarks.simulation --out after.json --compare before.json [--threshold 0.1]
+
+Every scenario is built and timed `--repeats` times, and runs are compared by their median over
+the repeats.  `--compare` exits with status 1 if a metric got slower by more than the threshold,
+by more than `--min-delta` seconds, and by more than the noise -- the new run's fastest repeat
+has to be slower than the old run's slowest.
+"""
+
+# name -> (map size, entity count)
+SCENARIOS: Dict[str, Tuple[int, int]] = {
+    "demo": (15, 63),
+    "small": (64, 1_000),
+    "medium": (256, 10_000),
+    "large": (1024, 100_000),
+    "huge": (2048, 100_000),
+}
+DEFAULT_SCENARIOS = ["demo", "small", "medium"]
+STORAGES = {"dict": DictStorage, "archetype": ArchetypeStorage}
+
+
+def build(size: int, entities: int, seed: int, storage: str = "dict", **pathfinding) -> World:
+    """
+    A `size` x `size` world with about `entities` entities, in the same mix as the demo:  a few
+    dwarves, then about as many walls as socks, and one stockpile.  At most half the map is filled,
+    so `World.random_coords` always finds free spots quickly.
+    """
+    random.seed(seed)
+    entities = max(4, min(entities, size * size // 2))
+    dorfs = max(2, entities // 32)
+    walls = (entities - dorfs - 1) // 2
+    world = World(storage=STORAGES[storage](), rows=size, cols=size)
+    populate(world, dorfs=dorfs, walls=walls, socks=entities - dorfs - walls - 1)
+    add_processors(world, display=False, **pathfinding)
+    return world
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "mean": sum(ordered) / len(ordered),
+        "p50": median(ordered),
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        "max": ordered[-1],
+    }
+
+
+def time_processors(world: World, ticks: int, warmup: int) -> Dict[str, Dict[str, float]]:
+    """Times real `World.process` ticks, with each processor's share taken from the world's profiler"""
+    previous = world.profiler
+    profiler = world.enable_profiling(window=ticks)
+    for _ in range(warmup):
+        world.process()
+    profiler.reset()
+    ticks_taken: List[float] = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        world.process()
+        ticks_taken.append(time.perf_counter() - start)
+    samples = {type(p).__name__: [s.seconds for s in profiler.stats.get(type(p).__name__, ())] for p in world.processors}
+    world.profiler = previous
+    samples["tick"] = ticks_taken
+    return {name: _summary(times) for name, times in samples.items() if times}
+
+
+def _per_call(fn: Callable[[], object], calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+
+def time_queries(world: World, seed: int, calls: int) -> Dict[str, float]:
+    """Seconds per call of each `World` query primitive"""
+    rng = random.Random(seed)
+    positioned = [entity for entity, _ in world.get_component(Position)]
+    entities = [rng.choice(positioned) for _ in range(calls)]
+    coords = [(rng.randrange(world.rows), rng.randrange(world.cols)) for _ in range(calls)]
+    entity_iter, coord_iter = iter(entities * 2), iter(coords * 2)
+    results = {
+        "get_component(Position)": _per_call(lambda: world.get_component(Position), calls),
+        "get_components(Position, Movement, Name, Debug)": _per_call(
+            lambda: world.get_components(Position, Movement, Name, Debug), calls
+        ),
+        "get_entity_component": _per_call(lambda: world.get_entity_component(next(entity_iter), Position), calls),
+        "has_component": _per_call(lambda: world.has_component(next(entity_iter), Stockable), calls),
+    }
+    results["entities_at"] = _per_call(lambda: world.entities_at(*next(coord_iter)), calls)
+    results["within(8)"] = _per_call(lambda: world.within(*next(coord_iter), 8), calls)
+    # `nearest` walks outwards ring by ring -- far fewer calls keep it from dominating the run
+    coord_iter = iter(coords)
+    few = max(1, calls // 10)
+    results["nearest(Stockable)"] = _per_call(
+        lambda: world.nearest(*next(coord_iter), lambda e: world.has_component(e, Stockable)), few
+    )
+    return results
+
+
+def run_scenario(name: str, size: int, entities: int, seed: int, ticks: int, warmup: int, calls: int,
+                 storage: str, repeats: int, **pathfinding) -> Dict[str, object]:
+    """Builds and times the scenario `repeats` times over -- one entry in `runs` per repeat"""
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        world = build(size, entities, seed, storage, **pathfinding)
+        build_time = time.perf_counter() - start
+        runs.append({
+            "build": build_time,
+            "processors": time_processors(world, ticks, warmup),
+            "queries": time_queries(world, seed, calls),
+        })
+    return {"size": size, "entities": len(world.entities), "runs": runs}
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results: Dict[str, object]) -> Dict[str, List[float]]:
+    """
+    Every timing in a results file as `scenario/section/metric` -> seconds in each repeat (lower is
+    better).  A processor's time in a repeat is its median tick, which a stray slow tick can't move.
+    """
+    flat: Dict[str, List[float]] = {}
+    for scenario, result in results["scenarios"].items():
+        for run in result["runs"]:
+            flat.setdefault(f"{scenario}/build", []).append(run["build"])
+            for processor, summary in run["processors"].items():
+                flat.setdefault(f"{scenario}/processors/{processor}", []).append(summary["p50"])
+            for query, seconds in run["queries"].items():
+                flat.setdefault(f"{scenario}/queries/{query}", []).append(seconds)
+    return flat
+
+
+def compare(old: Dict[str, object], new: Dict[str, object], threshold: float, min_delta: float) -> List[str]:
+    """
+    One line per metric found in both runs, comparing the medians over the repeats.  A slowdown is
+    only flagged if it's beyond `threshold`, beyond `min_delta` seconds, and beyond the noise:  every
+    new repeat has to be slower than every old one.
+    """
+    before, after = flatten(old), flatten(new)
+    lines: List[str] = []
+    for key in sorted(before.keys() & after.keys()):
+        old_time, new_time = median(before[key]), median(after[key])
+        if not old_time:
+            continue
+        change = new_time / old_time - 1
+        regressed = change > threshold and new_time - old_time > min_delta and min(after[key]) > max(before[key])
+        flag = "  REGRESSION" if regressed else ""
+        lines.append(f"{key:<70} {old_time * 1000:>10.4f}ms -> {new_time * 1000:>10.4f}ms {change:>+8.1%}{flag}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-processor and query timings on seeded, scaled-up worlds")
+    parser.add_argument("--scenarios", nargs="+", default=DEFAULT_SCENARIOS, choices=list(SCENARIOS))
+    parser.add_argument("--size", type=int, help="Custom scenario:  map width/height (needs --entities)")
+    parser.add_argument("--entities", type=int, help="Custom scenario:  entity count (needs --size)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ticks", type=int, default=20, help="Timed ticks per scenario")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed ticks before timing starts")
+    parser.add_argument("--calls", type=int, default=1000, help="Calls per query primitive")
+    parser.add_argument("--repeats", type=int, default=5, help="Times each scenario is built and timed")
+    parser.add_argument("--storage", choices=list(STORAGES), default="dict")
+    parser.add_argument("--mode", choices=["astar", "hpa"], default="astar", help="Pathfinding mode")
+    parser.add_argument("--out", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare against an earlier results file")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown that counts as a regression")
+    parser.add_argument("--min-delta", type=float, default=5e-6,
+                        help="Smallest slowdown in seconds that counts as a regression")
+    args = parser.parse_args()
+    scenarios = {name: SCENARIOS[name] for name in args.scenarios}
+    if args.size or args.entities:
+        if not (args.size and args.entities):
+            parser.error("--size and --entities go together")
+        scenarios = {f"custom-{args.size}-{args.entities}": (args.size, args.entities)}
+    results = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "storage": args.storage,
+        "mode": args.mode,
+        "repeats": args.repeats,
+        "scenarios": {},
+    }
+    for name, (size, entities) in scenarios.items():
+        result = run_scenario(
+            name, size, entities, args.seed, args.ticks, args.warmup, args.calls, args.storage, args.repeats,
+            mode=args.mode
+        )
+        results["scenarios"][name] = result
+        runs = result["runs"]
+        build_time = median(run["build"] for run in runs)
+        print(f"{name}: {size}x{size}, {result['entities']:,} entities  (built in {build_time:.2f}s, "
+              f"median of {len(runs)})")
+        for processor in runs[0]["processors"]:
+            p50 = median(run["processors"][processor]["p50"] for run in runs)
+            p99 = max(run["processors"][processor]["p99"] for run in runs)
+            print(f"    {processor:<24} p50 {p50 * 1000:>9.3f}ms  p99 {p99 * 1000:>9.3f}ms")
+        for query in runs[0]["queries"]:
+            seconds = median(run["queries"][query] for run in runs)
+            print(f"    {query:<48} {seconds * 1e6:>10.2f}us/call")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        lines = compare(old, results, args.threshold, args.min_delta)
+        print("\n".join(lines))
+        if any(line.endswith("REGRESSION") for line in lines):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
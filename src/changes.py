@@ -0,0 +1,36 @@
+from typing import Set, Tuple, Type
+
+from base import C, Entity
+
+
+class Changes:
+    """
+    The entities whose components (of the tracked types) were added, removed or modified since
+    the subscriber last cleared it.  Handed out by `World.track_changes`.
+
+    An entity can show up in more than one set (e.g. a `Position` removed and then added again),
+    so subscribers should look at the entity's current components rather than replaying history.
+    """
+    components: Tuple[Type[C], ...]
+    added: Set[Entity]
+    removed: Set[Entity]
+    # Replaced by `add_component`, or mutated in place and flagged with `World.mark_changed`
+    modified: Set[Entity]
+
+    def __init__(self, components: Tuple[Type[C], ...]) -> None:
+        self.components = components
+        self.added = set()
+        self.removed = set()
+        self.modified = set()
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.modified)
+
+    def touched(self) -> Set[Entity]:
+        """Every entity with any change at all"""
+        return self.added | self.removed | self.modified
+
+    def clear(self) -> None:
+        self.added.clear()
+        self.removed.clear()
+        self.modified.clear()
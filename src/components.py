@@ -1,15 +1,16 @@
 from typing import List, Optional, Tuple, Dict, Union
-from dataclasses import dataclass as component, field
+from dataclasses import field
 
 from base import Entity, Task, HaulStep
+from ordered_set import OrderedSet
+from paths import Path
+from registry import component
 
 
 @component
 class Debug:
-    messages: List[str] = field(default_factory=list)
-
-    def __str__(self) -> str:
-        return "\n".join(self.messages)
+    # Just a flag:  `DebugProcessor` prints the trace events (see `World.trace`) of entities that have it
+    pass
 
 
 @component
@@ -33,12 +34,13 @@ class Position:
 class Movement:
     speed: int = 1
     target: Optional[Tuple[int, int]] = None
-    path: List[Tuple[int, int]] = field(default_factory=list)
+    # Steps still ahead -- always a `Path`, e.g. `Path([(x, y), ...])`;  an empty one is "no path"
+    path: Path = field(default_factory=Path)
 
 
 @component
 class Inventory:
-    contents: List[Entity] = field(default_factory=list)
+    contents: OrderedSet[Entity] = field(default_factory=OrderedSet)
 
 
 @component
@@ -63,12 +65,12 @@ class Weight:
     weight: int = 1
 
 
-@component
+@component(frozen=True)
 class Name:
     name: str
 
 
-@component
+@component(frozen=True)
 class Display:
     icon: str
 
@@ -97,3 +99,5 @@ class Tasked:
 
     def __init__(self):
         self.priorities = {task: task.value for task in Task}
+        # Slotted, so the class-level default isn't there to fall back on
+        self.current_task = Task.IDLE
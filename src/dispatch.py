@@ -0,0 +1,112 @@
+from typing import Dict, List, Optional, Protocol, Set
+
+from base import Entity, Task
+from changes import Changes
+from components import Tasked
+
+"""
+Task dispatch:  decides which task each `Tasked` entity works on, without re-sorting everyone's
+priorities every tick.
+
+    ordered     each entity's tasks, highest priority first -- re-sorted only when its `Tasked` changes
+    sources     per task, where its work comes from (e.g. the hauling job board for `Task.HAUL`)
+    waiting     per task, the entities that would rather be doing it, but it had no work
+
+An entity is only reconsidered ("woken") when its priorities change, when it runs out of work for
+its current task (`finished`), or when a task it's waiting on gets work again.
+"""
+
+
+class WorkSource(Protocol):
+    def has_work(self) -> bool:
+        ...
+
+
+class TaskDispatcher:
+    world: object
+    sources: Dict[Task, WorkSource]
+    ordered: Dict[Entity, List[Task]]
+    waiting: Dict[Task, Set[Entity]]
+    # Entity -> the tasks it's in `waiting` for, to take it back out when it's woken
+    waits_on: Dict[Entity, List[Task]]
+    # Entities to (re)assign on the next `dispatch`
+    awake: Set[Entity]
+    changes: Changes
+
+    def __init__(self, world) -> None:
+        self.world = world
+        self.sources = {}
+        self.ordered = {}
+        self.waiting = {}
+        self.waits_on = {}
+        self.awake = set()
+        self.changes = world.track_changes(Tasked)
+
+    def add_source(self, task: Task, source: WorkSource) -> None:
+        self.sources[task] = source
+        # Whoever passed on this task before its work could be known should take another look
+        self.awake |= self.waiting.pop(task, set())
+
+    def set_priority(self, entity: Entity, task: Task, priority: int) -> None:
+        """Changes one task's priority for the entity (and wakes it up to reconsider)"""
+        self.world.get_entity_component(entity, Tasked).priorities[task] = priority
+        self.world.mark_changed(entity, Tasked)
+
+    def finished(self, entity: Entity) -> None:
+        """Called by a task's processor when the entity has nothing left to do for its current task"""
+        self.awake.add(entity)
+
+    def has_work(self, task: Task) -> bool:
+        if task == Task.IDLE:
+            return True
+        source = self.sources.get(task)
+        return source is not None and source.has_work()
+
+    def _forget(self, entity: Entity) -> None:
+        for task in self.waits_on.pop(entity, ()):
+            self.waiting[task].discard(entity)
+
+    def _refresh(self) -> None:
+        for entity in self.changes.touched():
+            self._forget(entity)
+            tasked = self.world.get_entity_component(entity, Tasked)
+            if tasked is None:
+                self.ordered.pop(entity, None)
+                self.awake.discard(entity)
+                continue
+            # Stable, so equal priorities keep the order they were given in
+            self.ordered[entity] = sorted(tasked.priorities, key=lambda t: tasked.priorities[t], reverse=True)
+            self.awake.add(entity)
+        self.changes.clear()
+        for task, entities in list(self.waiting.items()):
+            if entities and self.has_work(task):
+                self.awake |= entities
+                entities.clear()
+
+    def _choose(self, entity: Entity) -> Optional[Task]:
+        skipped: List[Task] = []
+        for task in self.ordered[entity]:
+            if self.has_work(task):
+                break
+            skipped.append(task)
+        else:
+            task = None
+        for waited in skipped:
+            self.waiting.setdefault(waited, set()).add(entity)
+        self.waits_on[entity] = skipped
+        return task
+
+    def dispatch(self) -> Dict[Entity, Task]:
+        """The new task of every entity that was woken and ends up switching tasks"""
+        self._refresh()
+        switched: Dict[Entity, Task] = {}
+        for entity in sorted(self.awake):
+            self._forget(entity)
+            task = self._choose(entity)
+            if task is None:
+                continue
+            tasked = self.world.get_entity_component(entity, Tasked)
+            if tasked.current_task != task:
+                switched[entity] = task
+        self.awake.clear()
+        return switched
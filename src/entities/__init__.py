@@ -1 +1,2 @@
 from entities.dorf import Dorf
+from entities.prefabs import *
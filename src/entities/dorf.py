@@ -1,17 +1,8 @@
 from processors import *
+from entities.prefabs import DORF
 
 
 class Dorf:
     @staticmethod
     def init(name: str, icon: str, pos: Tuple[int, int], carry: int = 5):
-        return [
-            Name(name=name),
-            Position(*pos),
-            Movement(),
-            Inventory(),
-            MaxCarry(max_weight=carry),
-            Tasked(),
-            # Debug Processors
-            Display(icon=icon),
-            Debug(),
-        ]
+        return DORF.make(Name=name, Position=pos, MaxCarry={"max_weight": carry}, Display=icon)
@@ -0,0 +1,29 @@
+from components import *
+from prefab import Prefab
+
+"""
+The standard prefabs -- spawn them in bulk with `World.add_entities`.
+"""
+
+DORF = Prefab(
+    "Dorf",
+    Name, Position, Movement, Inventory, MaxCarry, Tasked,
+    # Debug Processors
+    Display, Debug,
+    defaults={MaxCarry: {"max_weight": 5}},
+)
+WALL = Prefab(
+    "Wall",
+    Position, Obstacle, Display,
+    defaults={Obstacle: {"is_passable": False}, Display: {"icon": "█"}},
+)
+SOCK = Prefab(
+    "Sock",
+    Position, Name, Weight, Stockable, Display,
+    defaults={Display: {"icon": "s"}},
+)
+STOCKPILE = Prefab(
+    "Stockpile",
+    Name, Inventory, Region, Display,
+    defaults={Display: {"icon": "@"}},
+)
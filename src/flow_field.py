@@ -0,0 +1,154 @@
+from array import array
+from heapq import heappush, heappop
+from typing import Dict, Set, List, Optional, Tuple, Iterable, FrozenSet
+
+from a_star import NavGrid
+
+"""
+Flow fields (a.k.a. Dijkstra maps):  one distance field per set of targets, shared by every
+entity heading there.  Once a field is built, reading the next step from any cell is O(1).
+
+REFERENCES:
+    http://www.roguebasin.com/index.php/The_Incredible_Power_of_Dijkstra_Maps
+    https://www.redblobgames.com/pathfinding/tower-defense/
+"""
+
+Coords = Tuple[int, int]
+UNREACHABLE = -1
+
+
+class FlowField:
+    """Walking distance from every cell of the nav grid to the closest of `targets`"""
+    nav: NavGrid
+    targets: FrozenSet[Coords]
+    distances: array
+    # The nav grid version this field was built against
+    version: int
+
+    def __init__(self, nav: NavGrid, targets: Iterable[Coords]) -> None:
+        self.nav = nav
+        self.targets = frozenset(targets)
+        self.build()
+
+    def build(self) -> None:
+        """Multi-source Dijkstra outward from every (open) target cell"""
+        nav = self.nav
+        rows, cols, obstacles, costs = nav.rows, nav.cols, nav.obstacles, nav.costs
+        distances = array("i", [UNREACHABLE]) * (rows * cols)
+        frontier: List[Tuple[int, int]] = []
+        for x, y in self.targets:
+            if nav.in_bounds(x, y) and not obstacles[x * cols + y]:
+                distances[x * cols + y] = 0
+                frontier.append((0, x * cols + y))
+        frontier.sort()
+        while frontier:
+            dist, current = heappop(frontier)
+            if dist > distances[current]:
+                continue
+            x, y = divmod(current, cols)
+            # A mover at a neighbour pays this cell's step cost to come here
+            new_dist = dist + (costs[current] if costs is not None else 1)
+            for nx, ny in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+                if nx < 0 or ny < 0 or nx >= rows or ny >= cols:
+                    continue
+                next = nx * cols + ny
+                if obstacles[next]:
+                    continue
+                if distances[next] == UNREACHABLE or new_dist < distances[next]:
+                    distances[next] = new_dist
+                    heappush(frontier, (new_dist, next))
+        self.distances = distances
+        self.version = nav.version
+
+    @property
+    def stale(self) -> bool:
+        return self.version != self.nav.version
+
+    def distance(self, x: int, y: int) -> Optional[int]:
+        """Walking cost from (x, y) to the closest target, or None if none can be reached"""
+        if not self.nav.in_bounds(x, y):
+            return None
+        dist = self.distances[x * self.nav.cols + y]
+        return None if dist == UNREACHABLE else dist
+
+    def next_step(self, x: int, y: int) -> Optional[Coords]:
+        """The neighbouring cell that is one step closer to a target"""
+        dist = self.distance(x, y)
+        if not dist:
+            return None
+        nav = self.nav
+        for nx, ny in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+            next_dist = self.distance(nx, ny)
+            if next_dist is not None and next_dist + nav.step_cost(nx * nav.cols + ny) == dist:
+                return nx, ny
+        return None
+
+    def path_from(self, x: int, y: int) -> List[Coords]:
+        """
+        Follows the field down to the closest target.  Like `a_star.find_path`, the path
+        excludes the start and ends on the target -- and is `[]` if no target can be reached.
+        """
+        dist = self.distance(x, y)
+        if dist is None:
+            return []
+        if dist == 0:
+            return [(x, y)]
+        path: List[Coords] = []
+        step = self.next_step(x, y)
+        while step:
+            path.append(step)
+            step = self.next_step(*step)
+        return path
+
+    def goal_from(self, x: int, y: int) -> Optional[Coords]:
+        """The target the field leads to from (x, y)"""
+        path = self.path_from(x, y)
+        return path[-1] if path else None
+
+
+class FlowFields:
+    """
+    Cache of flow fields keyed by their target set.  A field is rebuilt lazily the next time
+    it's used after the nav grid changed; the least recently used fields are dropped past `max_fields`.
+    """
+    nav: NavGrid
+    max_fields: int
+    fields: Dict[FrozenSet[Coords], FlowField]
+    # Target cell -> the target sets of every cached field that includes it
+    by_target: Dict[Coords, Set[FrozenSet[Coords]]]
+
+    def __init__(self, nav: NavGrid, max_fields: int = 64) -> None:
+        self.nav = nav
+        self.max_fields = max_fields
+        self.fields = {}
+        self.by_target = {}
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def get(self, targets: Iterable[Coords]) -> FlowField:
+        key = frozenset(targets)
+        field = self.fields.pop(key, None)
+        if field is None:
+            field = FlowField(self.nav, key)
+            for target in key:
+                self.by_target.setdefault(target, set()).add(key)
+            if len(self.fields) >= self.max_fields:
+                self._evict(next(iter(self.fields)))
+        elif field.stale:
+            field.build()
+        # Re-inserting keeps the dict in least -> most recently used order
+        self.fields[key] = field
+        return field
+
+    def containing(self, target: Coords) -> List[FlowField]:
+        """Every cached field that leads (among other places) to `target`"""
+        return [self.get(key) for key in list(self.by_target.get(target, ()))]
+
+    def _evict(self, key: FrozenSet[Coords]) -> None:
+        del self.fields[key]
+        for target in key:
+            keys = self.by_target[target]
+            keys.discard(key)
+            if not keys:
+                del self.by_target[target]
@@ -0,0 +1,90 @@
+from typing import Dict, List, Optional, Tuple
+
+from base import Entity, HaulStep
+from changes import Changes
+from components import Position, Weight, Stockable, Hauls
+from spatial import SpatialIndex
+
+"""
+Hauling job board:  every item waiting to be hauled to a stockpile, and who is fetching what.
+
+    available       spatial index of the positioned, unstocked, unclaimed `Stockable` items
+    reservations    item -> the hauler on its way to pick it up
+
+Idle haulers are handed items once per tick in one batch (`assign`), so two haulers never race
+for the same item, and no hauler has to scan the world for one.
+"""
+
+
+class HaulingBoard:
+    world: object
+    available: SpatialIndex
+    reservations: Dict[Entity, Entity]
+    changes: Changes
+
+    def __init__(self, world) -> None:
+        self.world = world
+        self.available = SpatialIndex()
+        self.reservations = {}
+        self.changes = world.track_changes(Position, Weight, Stockable)
+        for item, _ in world.get_components(Position, Weight, Stockable):
+            self._offer(item)
+
+    def _haulable(self, item: Entity) -> Optional[Position]:
+        """The item's position if it's waiting to be hauled, otherwise None"""
+        world = self.world
+        if not world.has_component(item, Stockable) or not world.has_component(item, Weight):
+            return None
+        if world.regions.region_of(item) is not None:
+            return None
+        return world.get_entity_component(item, Position)
+
+    def _offer(self, item: Entity) -> None:
+        position = self._haulable(item) if item not in self.reservations else None
+        if position is None:
+            self.available.remove(item)
+        else:
+            self.available.move(item, position.x, position.y)
+
+    def refresh(self) -> None:
+        """Catches up with items that moved, were picked up or stocked, and with haulers that gave up"""
+        for item in sorted(self.changes.touched()):
+            self._offer(item)
+        self.changes.clear()
+        for item, hauler in list(self.reservations.items()):
+            hauls = self.world.get_entity_component(hauler, Hauls)
+            if hauls is None or hauls.step != HaulStep.FIND_ITEM or not hauls.items or hauls.items[-1] != item:
+                self.release(item)
+
+    def assign(self, haulers: List[Tuple[Entity, Position, int]]) -> Dict[Entity, Entity]:
+        """
+        Hands each (hauler, position, spare carrying capacity) the nearest available item it can carry,
+        greedily in hauler order.  Every item handed out is reserved until `release`/`picked_up`.
+        """
+        self.refresh()
+        assigned: Dict[Entity, Entity] = {}
+        for hauler, position, capacity in haulers:
+            def fits(item: Entity) -> bool:
+                weight = self.world.get_entity_component(item, Weight)
+                # The regions can change without the item moving (e.g. a new stockpile around it)
+                return weight.weight <= capacity and self.world.regions.region_of(item) is None
+
+            item = self.available.nearest(position.x, position.y, fits)
+            if item is not None:
+                self.reservations[item] = hauler
+                self.available.remove(item)
+                assigned[hauler] = item
+        return assigned
+
+    def release(self, item: Entity) -> None:
+        """Gives up the claim on an item, putting it back on the board if it still needs hauling"""
+        if self.reservations.pop(item, None) is not None:
+            self._offer(item)
+
+    def picked_up(self, item: Entity) -> None:
+        self.reservations.pop(item, None)
+        self.available.remove(item)
+
+    def has_work(self) -> bool:
+        self.refresh()
+        return len(self.available) > 0
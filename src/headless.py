@@ -0,0 +1,142 @@
+import argparse
+import random
+import sys
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from world import World
+from scenario import populate, add_processors
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+"""
+Headless runner:  runs the simulation with no rendering and no sleeping, then reports throughput.
+
+    python headless.py --ticks 1000 --size 64 --seed 1
+    python headless.py --duration 30 --timestep 0.05
+"""
+
+
+@dataclass
+class RunReport:
+    ticks: int
+    seconds: float
+    tick_times: List[float]
+    # Peak resident set size in KiB, if the platform can tell us
+    peak_rss: Optional[int]
+
+    @property
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.seconds if self.seconds else 0.0
+
+    def percentile(self, pct: float) -> float:
+        if not self.tick_times:
+            return 0.0
+        ordered = sorted(self.tick_times)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    @property
+    def mean(self) -> float:
+        return sum(self.tick_times) / len(self.tick_times) if self.tick_times else 0.0
+
+    def __str__(self) -> str:
+        rss = f"{self.peak_rss / 1024:.1f} MiB" if self.peak_rss is not None else "n/a"
+        return (
+            f"{self.ticks} ticks in {self.seconds:.2f}s ({self.ticks_per_second:.1f} ticks/sec)\n"
+            f"tick time:  mean {self.mean * 1000:.3f}ms  p50 {self.percentile(50) * 1000:.3f}ms  "
+            f"p99 {self.percentile(99) * 1000:.3f}ms\n"
+            f"peak RSS:   {rss}"
+        )
+
+
+def peak_rss() -> Optional[int]:
+    if resource is None:
+        return None
+    # Linux reports KiB, macOS reports bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss //= 1024
+    return rss
+
+
+def build_world(size: int = 15, seed: Optional[int] = None, dorfs: Optional[int] = None,
+                walls: Optional[int] = None, socks: Optional[int] = None, **config) -> World:
+    """
+    A `size` x `size` world populated like `run.main` -- counts that aren't given keep the
+    same density as the default 15x15 map.  `config` goes to `PathfindingProcessor`.
+    """
+    if seed is not None:
+        random.seed(seed)
+    area = size * size
+    world = World(rows=size, cols=size)
+    populate(
+        world,
+        dorfs=dorfs if dorfs is not None else max(2, area // 112),
+        walls=walls if walls is not None else area * 30 // 225,
+        socks=socks if socks is not None else area * 30 // 225,
+    )
+    add_processors(world, display=False, **config)
+    return world
+
+
+def run(world: World, ticks: Optional[int] = None, duration: Optional[float] = None,
+        timestep: Optional[float] = None, max_catch_up: int = 5) -> RunReport:
+    """
+    Runs `ticks` ticks, or for `duration` seconds of wall-clock time (whichever comes first).
+
+    With a `timestep`, ticks are paced to one every `timestep` seconds.  A tick that runs late is
+    caught up with back-to-back ticks, but never more than `max_catch_up` at once -- beyond that
+    the lost time is dropped rather than spiralling.
+    """
+    if ticks is None and duration is None:
+        raise ValueError("Give a number of ticks, a duration, or both")
+    tick_times: List[float] = []
+    start = time.perf_counter()
+    next_tick = start
+    while True:
+        now = time.perf_counter()
+        if (ticks is not None and len(tick_times) >= ticks) or (duration is not None and now - start >= duration):
+            break
+        if timestep:
+            if now < next_tick:
+                time.sleep(next_tick - now)
+                continue
+            if now - next_tick > max_catch_up * timestep:
+                next_tick = now - max_catch_up * timestep
+            next_tick += timestep
+        world.process()
+        tick_times.append(time.perf_counter() - now)
+    return RunReport(
+        ticks=len(tick_times), seconds=time.perf_counter() - start, tick_times=tick_times, peak_rss=peak_rss()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the simulation headless and report throughput")
+    parser.add_argument("--ticks", type=int, help="Number of ticks to run")
+    parser.add_argument("--duration", type=float, help="Wall-clock seconds to run for")
+    parser.add_argument("--timestep", type=float, help="Fixed seconds per tick (default: as fast as possible)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--size", type=int, default=15, help="Map width/height")
+    parser.add_argument("--dorfs", type=int)
+    parser.add_argument("--walls", type=int)
+    parser.add_argument("--socks", type=int)
+    parser.add_argument("--profile", type=int, nargs="?", const=0, metavar="EVERY",
+                        help="Profile the processors; print the stats at the end (and every EVERY ticks if given)")
+    args = parser.parse_args()
+    if args.ticks is None and args.duration is None:
+        args.ticks = 1000
+    world = build_world(args.size, args.seed, args.dorfs, args.walls, args.socks)
+    if args.profile is not None:
+        world.enable_profiling(report_every=args.profile or None)
+    print(run(world, ticks=args.ticks, duration=args.duration, timestep=args.timestep))
+    if world.profiler is not None:
+        print(world.profiler.format())
+
+
+if __name__ == "__main__":
+    main()
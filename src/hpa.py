@@ -0,0 +1,267 @@
+from collections import deque
+from heapq import heappush, heappop
+from typing import Dict, Set, List, Optional, Tuple
+
+from a_star import NavGrid
+
+"""
+Hierarchical pathfinding (HPA*) for large maps.
+
+The map is split into square clusters.  Wherever two neighbouring clusters share a run of
+open border cells, an entrance (a pair of cells, one on each side) is placed.  Paths are found
+by searching the small abstract graph of entrances first, then refined into tiles one cluster
+at a time -- so a search never has to flood the whole grid.
+
+REFERENCES:
+    https://webdocs.cs.ualberta.ca/~mmueller/ps/hpastar.pdf
+"""
+
+Coords = Tuple[int, int]
+Cluster = Tuple[int, int]
+# Runs of open border cells at least this long get an entrance at both ends instead of one in the middle
+LONG_ENTRANCE = 6
+
+
+class HierarchicalPathfinder:
+    nav: NavGrid
+    cluster_size: int
+    # Border between two clusters (lower cluster first) -> its entrance cell pairs
+    borders: Dict[Tuple[Cluster, Cluster], List[Tuple[int, int]]]
+    # Entrance cell -> the entrance cells it connects to across a border (always 1 step)
+    links: Dict[int, Set[int]]
+    # Cluster -> {entrance -> {other entrance -> cost}} -- built lazily as the search reaches the cluster
+    intra: Dict[Cluster, Dict[int, Dict[int, int]]]
+    # Cells changed on the nav grid since the clusters were last brought up to date
+    dirty: Set[Coords]
+
+    def __init__(self, nav: NavGrid, cluster_size: int = 16) -> None:
+        self.nav = nav
+        self.cluster_size = cluster_size
+        self.borders = {}
+        self.links = {}
+        self.intra = {}
+        self.dirty = nav.track_changes()
+        for cluster in self.clusters():
+            for neighbor in ((cluster[0] + 1, cluster[1]), (cluster[0], cluster[1] + 1)):
+                self._build_border(cluster, neighbor)
+
+    # ---- Clusters ---- #
+    def clusters(self) -> List[Cluster]:
+        size = self.cluster_size
+        return [
+            (cx, cy)
+            for cx in range((self.nav.rows + size - 1) // size)
+            for cy in range((self.nav.cols + size - 1) // size)
+        ]
+
+    def cluster_of(self, idx: int) -> Cluster:
+        x, y = divmod(idx, self.nav.cols)
+        return x // self.cluster_size, y // self.cluster_size
+
+    def bounds(self, cluster: Cluster) -> Tuple[int, int, int, int]:
+        """(min x, min y, max x, max y) of the cluster, inclusive"""
+        size = self.cluster_size
+        x0, y0 = cluster[0] * size, cluster[1] * size
+        return x0, y0, min(x0 + size, self.nav.rows) - 1, min(y0 + size, self.nav.cols) - 1
+
+    def entrances(self, cluster: Cluster) -> Set[int]:
+        found: Set[int] = set()
+        cx, cy = cluster
+        for key in (((cx - 1, cy), cluster), ((cx, cy - 1), cluster), (cluster, (cx + 1, cy)), (cluster, (cx, cy + 1))):
+            for a, b in self.borders.get(key, ()):
+                found.add(a if key[0] == cluster else b)
+        return found
+
+    # ---- Building ---- #
+    def _build_border(self, a: Cluster, b: Cluster) -> None:
+        """Places entrances along the border between `a` and the cluster below/right of it, `b`"""
+        for x, y in self.borders.pop((a, b), ()):
+            self.links[x].discard(y)
+            self.links[y].discard(x)
+        if a[0] < 0 or a[1] < 0:
+            return
+        ax0, ay0, ax1, ay1 = self.bounds(a)
+        cols, obstacles = self.nav.cols, self.nav.obstacles
+        if b[0] > a[0]:  # `b` is below `a`: the border runs along a's last row
+            if ax1 + 1 >= self.nav.rows:
+                return
+            pairs = [(ax1 * cols + y, (ax1 + 1) * cols + y) for y in range(ay0, ay1 + 1)]
+        else:  # `b` is right of `a`: the border runs along a's last column
+            if ay1 + 1 >= self.nav.cols:
+                return
+            pairs = [(x * cols + ay1, x * cols + ay1 + 1) for x in range(ax0, ax1 + 1)]
+        entrances: List[Tuple[int, int]] = []
+        run: List[Tuple[int, int]] = []
+        for pair in pairs + [None]:
+            if pair and not obstacles[pair[0]] and not obstacles[pair[1]]:
+                run.append(pair)
+                continue
+            if len(run) >= LONG_ENTRANCE:
+                entrances.extend((run[0], run[-1]))
+            elif run:
+                entrances.append(run[len(run) // 2])
+            run = []
+        for x, y in entrances:
+            self.links.setdefault(x, set()).add(y)
+            self.links.setdefault(y, set()).add(x)
+        self.borders[(a, b)] = entrances
+
+    def _local_search(self, start: int, cluster: Cluster) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """
+        Search from `start` that never leaves `cluster` -- returns (distances, came_from).
+        Breadth-first on plain ground, Dijkstra once the nav grid has step costs.
+        """
+        if self.nav.costs is not None:
+            return self._weighted_search(start, cluster)
+        x0, y0, x1, y1 = self.bounds(cluster)
+        cols, obstacles = self.nav.cols, self.nav.obstacles
+        distances = {start: 0}
+        came_from: Dict[int, int] = {}
+        frontier = deque([start])
+        while frontier:
+            current = frontier.popleft()
+            x, y = divmod(current, cols)
+            for nx, ny in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+                if nx < x0 or ny < y0 or nx > x1 or ny > y1:
+                    continue
+                next = nx * cols + ny
+                if obstacles[next] or next in distances:
+                    continue
+                distances[next] = distances[current] + 1
+                came_from[next] = current
+                frontier.append(next)
+        return distances, came_from
+
+    def _weighted_search(self, start: int, cluster: Cluster) -> Tuple[Dict[int, int], Dict[int, int]]:
+        x0, y0, x1, y1 = self.bounds(cluster)
+        cols, obstacles, costs = self.nav.cols, self.nav.obstacles, self.nav.costs
+        distances = {start: 0}
+        came_from: Dict[int, int] = {}
+        frontier = [(0, start)]
+        while frontier:
+            dist, current = heappop(frontier)
+            if dist > distances[current]:
+                continue
+            x, y = divmod(current, cols)
+            for nx, ny in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+                if nx < x0 or ny < y0 or nx > x1 or ny > y1:
+                    continue
+                next = nx * cols + ny
+                if obstacles[next]:
+                    continue
+                new_dist = dist + costs[next]
+                if next not in distances or new_dist < distances[next]:
+                    distances[next] = new_dist
+                    came_from[next] = current
+                    heappush(frontier, (new_dist, next))
+        return distances, came_from
+
+    def _intra_edges(self, cluster: Cluster) -> Dict[int, Dict[int, int]]:
+        try:
+            return self.intra[cluster]
+        except KeyError:
+            entrances = self.entrances(cluster)
+            edges: Dict[int, Dict[int, int]] = {}
+            for entrance in entrances:
+                distances, _ = self._local_search(entrance, cluster)
+                edges[entrance] = {e: distances[e] for e in entrances if e != entrance and e in distances}
+            return self.intra.setdefault(cluster, edges)
+
+    def refresh(self) -> None:
+        """Rebuilds only the clusters (and their borders) touched by nav grid changes"""
+        if not self.dirty:
+            return
+        affected: Set[Cluster] = set()
+        for x, y in self.dirty:
+            affected.add((x // self.cluster_size, y // self.cluster_size))
+        self.dirty.clear()
+        stale: Set[Cluster] = set()
+        for cx, cy in affected:
+            self._build_border((cx - 1, cy), (cx, cy))
+            self._build_border((cx, cy - 1), (cx, cy))
+            self._build_border((cx, cy), (cx + 1, cy))
+            self._build_border((cx, cy), (cx, cy + 1))
+            # The neighbours' entrances may have changed along with the shared borders
+            stale.update(((cx, cy), (cx - 1, cy), (cx + 1, cy), (cx, cy - 1), (cx, cy + 1)))
+        for cluster in stale:
+            self.intra.pop(cluster, None)
+
+    # ---- Searching ---- #
+    def find_path(self, start_x: int, start_y: int, end_x: int, end_y: int) -> List[Coords]:
+        """Same contract as `a_star.find_path`:  excludes the start, ends on the goal, `[]` if unreachable"""
+        nav = self.nav
+        if not nav.in_bounds(start_x, start_y) or not nav.in_bounds(end_x, end_y) or nav.is_blocked(end_x, end_y):
+            return []
+        self.refresh()
+        cols = nav.cols
+        start, end = start_x * cols + start_y, end_x * cols + end_y
+        if start == end:
+            return [(end_x, end_y)]
+        start_cluster, end_cluster = self.cluster_of(start), self.cluster_of(end)
+        start_dist, _ = self._local_search(start, start_cluster)
+        end_dist, _ = self._local_search(end, end_cluster)
+        # Temporary edges from the start, and into the goal
+        start_edges = {e: start_dist[e] for e in self.entrances(start_cluster) if e in start_dist}
+        if start_cluster == end_cluster and end in start_dist:
+            start_edges[end] = start_dist[end]
+        # The search went outward from the goal, so swap which end's step cost is counted
+        end_cost = nav.step_cost(end)
+        end_edges = {
+            e: end_dist[e] - nav.step_cost(e) + end_cost for e in self.entrances(end_cluster) if e in end_dist
+        }
+        nodes = self._abstract_search(start, end, start_edges, end_edges)
+        if not nodes:
+            return []
+        return self._refine(nodes)
+
+    def _abstract_search(self, start: int, end: int, start_edges: Dict[int, int],
+                         end_edges: Dict[int, int]) -> List[int]:
+        cols = self.nav.cols
+        end_x, end_y = divmod(end, cols)
+        cost_so_far = {start: 0}
+        came_from: Dict[int, int] = {}
+        frontier = [(0, start)]
+        while frontier:
+            _, current = heappop(frontier)
+            if current == end:
+                break
+            if current == start:
+                edges = list(start_edges.items())
+            else:
+                edges = list(self._intra_edges(self.cluster_of(current)).get(current, {}).items())
+            # Crossing a border is a single step onto the linked cell
+            edges.extend((link, self.nav.step_cost(link)) for link in self.links.get(current, ()))
+            if current != start and current in end_edges:
+                edges.append((end, end_edges[current]))
+            for next, cost in edges:
+                new_cost = cost_so_far[current] + cost
+                if next not in cost_so_far or new_cost < cost_so_far[next]:
+                    cost_so_far[next] = new_cost
+                    came_from[next] = current
+                    x, y = divmod(next, cols)
+                    heappush(frontier, (new_cost + abs(end_x - x) + abs(end_y - y), next))
+        if end not in came_from:
+            return []
+        nodes = [end]
+        while nodes[-1] != start:
+            nodes.append(came_from[nodes[-1]])
+        nodes.reverse()
+        return nodes
+
+    def _refine(self, nodes: List[int]) -> List[Coords]:
+        """Turns the abstract path into tiles, one cluster-local search per hop"""
+        cols = self.nav.cols
+        path: List[Coords] = []
+        for a, b in zip(nodes, nodes[1:]):
+            if b in self.links.get(a, ()):
+                path.append(divmod(b, cols))
+                continue
+            _, came_from = self._local_search(a, self.cluster_of(a))
+            hop: List[Coords] = []
+            step: Optional[int] = b
+            while step != a:
+                hop.append(divmod(step, cols))
+                step = came_from[step]
+            hop.reverse()
+            path.extend(hop)
+        return path
@@ -0,0 +1,54 @@
+from typing import Dict, Generic, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class OrderedSet(Generic[T]):
+    """
+    A set that remembers insertion order, with the list methods `Inventory.contents` was used with
+    (`append`, `remove`, `pop`) -- but membership tests and removals are O(1) instead of scans.
+    """
+    _items: Dict[T, None]
+
+    def __init__(self, items: Optional[Iterable[T]] = None) -> None:
+        self._items = dict.fromkeys(items) if items is not None else {}
+
+    def __contains__(self, item: T) -> bool:
+        return item in self._items
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, OrderedSet):
+            return list(self._items) == list(other._items)
+        return list(self._items) == other
+
+    def __repr__(self) -> str:
+        return f"OrderedSet({list(self._items)})"
+
+    def append(self, item: T) -> None:
+        """Adds the item at the end (does nothing if it's already in the set)"""
+        self._items[item] = None
+
+    add = append
+
+    def extend(self, items: Iterable[T]) -> None:
+        for item in items:
+            self._items[item] = None
+
+    def remove(self, item: T) -> None:
+        del self._items[item]
+
+    def discard(self, item: T) -> None:
+        self._items.pop(item, None)
+
+    def pop(self) -> T:
+        """Removes and returns the most recently added item"""
+        return self._items.popitem()[0]
+
+    def clear(self) -> None:
+        self._items.clear()
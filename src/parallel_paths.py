@@ -0,0 +1,107 @@
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+from a_star import NavGrid, find_path
+
+"""
+Parallel batch pathfinding.
+
+Every pending (start, target) request of a tick is solved at once across a process pool.
+The nav grid's obstacle bitmap and step costs live in shared memory, so workers read them in place
+instead of having them pickled with every request; they're only copied in there again after the grid changes.
+"""
+
+Request = Tuple[int, int, int, int]
+Path = List[Tuple[int, int]]
+
+# Worker-side:  shared memory name -> (the attached segment, a NavGrid reading straight from it)
+_attached: Dict[str, Tuple[SharedMemory, NavGrid]] = {}
+
+
+def _solve(name: str, rows: int, cols: int, weighted: bool, requests: List[Request]) -> List[Path]:
+    """Runs in a worker process -- attaches to the shared bitmap once, then reuses it"""
+    try:
+        shm, nav = _attached[name]
+    except KeyError:
+        shm = SharedMemory(name=name)
+        nav = NavGrid(rows, cols, obstacles=shm.buf[:rows * cols])
+        _attached[name] = (shm, nav)
+    # The step costs sit right after the bitmap, once the map has any
+    nav.costs = shm.buf[rows * cols:2 * rows * cols] if weighted else None
+    return [find_path(nav, *request) for request in requests]
+
+
+def _release(executor: ProcessPoolExecutor, shm: SharedMemory) -> None:
+    executor.shutdown(wait=True, cancel_futures=True)
+    shm.close()
+    shm.unlink()
+
+
+class BatchPathfinder:
+    """
+    Solves batches of path requests in parallel.  Results come back in request order, and each one
+    is exactly what `a_star.find_path` returns serially -- parallel and serial runs are identical.
+    """
+    nav: NavGrid
+    workers: Optional[int]
+    # Requests are split into roughly this many chunks per worker, to even out uneven searches
+    chunks_per_worker: int
+    _shm: Optional[SharedMemory]
+    _executor: Optional[ProcessPoolExecutor]
+    _finalizer: Optional[weakref.finalize]
+    # Nav grid version last copied into shared memory
+    _version: int
+
+    def __init__(self, nav: NavGrid, workers: Optional[int] = None, chunks_per_worker: int = 4) -> None:
+        self.nav = nav
+        self.workers = workers
+        self.chunks_per_worker = chunks_per_worker
+        self._shm = None
+        self._executor = None
+        self._finalizer = None
+        self._version = -1
+
+    def _start(self) -> None:
+        """The pool and shared memory are only set up once there's a batch to solve"""
+        # Room for the obstacle bitmap and the step costs
+        self._shm = SharedMemory(create=True, size=max(1, 2 * len(self.nav.obstacles)))
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        # Clean up the pool and the shared segment along with this object (or at exit)
+        self._finalizer = weakref.finalize(self, _release, self._executor, self._shm)
+
+    def _sync(self) -> None:
+        if self._version != self.nav.version:
+            size = len(self.nav.obstacles)
+            self._shm.buf[:size] = self.nav.obstacles
+            if self.nav.costs is not None:
+                self._shm.buf[size:2 * size] = self.nav.costs
+            self._version = self.nav.version
+
+    def solve(self, requests: List[Request]) -> List[Path]:
+        if not requests:
+            return []
+        if self._executor is None:
+            self._start()
+        self._sync()
+        workers = self.workers or os.cpu_count() or 1
+        size = max(1, len(requests) // (workers * self.chunks_per_worker))
+        chunks = [requests[i:i + size] for i in range(0, len(requests), size)]
+        futures = [
+            self._executor.submit(
+                _solve, self._shm.name, self.nav.rows, self.nav.cols, self.nav.costs is not None, chunk
+            )
+            for chunk in chunks
+        ]
+        paths: List[Path] = []
+        for future in futures:
+            paths.extend(future.result())
+        return paths
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._finalizer()
+            self._executor = None
+            self._shm = None
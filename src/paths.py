@@ -0,0 +1,68 @@
+from array import array
+from typing import Iterable, Iterator, Tuple
+
+"""
+Paths as movers follow them.
+
+A `Path` keeps its steps in two flat coordinate arrays and a cursor to the next step, so taking a
+step is an index bump instead of `list.pop(0)` (which shifts the whole rest of the path).  It acts
+like the list of the steps still ahead:  `len`, truthiness, iteration and indexing all only see
+those, and it compares equal to a list of them.
+"""
+
+Coords = Tuple[int, int]
+# The steps are never written after a path is built, so every empty path can share one array
+_EMPTY = array("i")
+
+
+class Path:
+    __slots__ = ("xs", "ys", "cursor")
+    xs: array
+    ys: array
+    # Index of the next step
+    cursor: int
+
+    def __init__(self, steps: Iterable[Coords] = ()) -> None:
+        steps = list(steps)
+        if not steps:
+            # Every `Movement` starts with one of these, so they'd better be cheap
+            self.xs = self.ys = _EMPTY
+            self.cursor = 0
+            return
+        self.xs = array("i", [x for x, _ in steps])
+        self.ys = array("i", [y for _, y in steps])
+        self.cursor = 0
+
+    def __len__(self) -> int:
+        return len(self.xs) - self.cursor
+
+    def __bool__(self) -> bool:
+        return self.cursor < len(self.xs)
+
+    def __iter__(self) -> Iterator[Coords]:
+        return zip(self.xs[self.cursor:], self.ys[self.cursor:])
+
+    def __getitem__(self, i: int) -> Coords:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("path index out of range")
+        return self.xs[self.cursor + i], self.ys[self.cursor + i]
+
+    def __eq__(self, other) -> bool:
+        try:
+            return len(self) == len(other) and all(a == tuple(b) for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Path({list(self)})"
+
+    def advance(self) -> Coords:
+        """Takes the next step"""
+        step = self[0]
+        self.cursor += 1
+        return step
+
+    def clear(self) -> None:
+        self.cursor = len(self.xs)
@@ -0,0 +1,91 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+from base import C
+
+"""
+Prefabs:  component layouts registered once by name ("Dorf", "Sock", ...) and stamped out in bulk.
+
+A prefab lists its component types and their default field values.  `build` takes column-style
+data -- one column per component type, named after it -- and makes every entity's components in
+one pass, ready for `World.add_entities`.  A column value can be:
+
+    a dict      keyword arguments, on top of the component's defaults
+    a tuple     positional arguments, instead of the defaults
+    anything    the component's only positional argument, instead of the defaults
+"""
+
+# Every prefab by name, so they can be spawned by name (see `World.add_entities`)
+PREFABS: Dict[str, "Prefab"] = {}
+
+
+class Prefab:
+    name: str
+    components: Tuple[Type[C], ...]
+    # Component type -> default keyword arguments
+    defaults: Dict[Type[C], Dict[str, Any]]
+
+    def __init__(self, name: str, *components: Type[C],
+                 defaults: Optional[Dict[Type[C], Dict[str, Any]]] = None) -> None:
+        self.name = name
+        self.components = components
+        self.defaults = defaults or {}
+        unknown = [cls.__name__ for cls in self.defaults if cls not in components]
+        if unknown:
+            raise ValueError(f"Defaults given for components not in {name}: {', '.join(unknown)}")
+        PREFABS[name] = self
+
+    def __repr__(self) -> str:
+        return f"Prefab({self.name!r}: {', '.join(cls.__name__ for cls in self.components)})"
+
+    def _make(self, cls: Type[C], value: Any) -> C:
+        defaults = self.defaults.get(cls, {})
+        if value is None:
+            return cls(**defaults)
+        if isinstance(value, dict):
+            return cls(**{**defaults, **value})
+        if isinstance(value, tuple):
+            return cls(*value)
+        return cls(value)
+
+    def build(self, count: Optional[int] = None, **columns: Iterable[Any]) -> List[List[C]]:
+        """
+        The components of `count` entities, e.g. `SOCK.build(Position=coords, Name=names)`.
+        `count` defaults to the length of the columns.
+        """
+        by_name = {cls.__name__: cls for cls in self.components}
+        unknown = [name for name in columns if name not in by_name]
+        if unknown:
+            raise ValueError(f"{self.name} has no {', '.join(unknown)} component")
+        values = {by_name[name]: list(column) for name, column in columns.items()}
+        if count is None:
+            if not values:
+                raise ValueError(f"Spawning {self.name}:  need a `count` or at least one column")
+            count = len(next(iter(values.values())))
+        short = [cls.__name__ for cls, column in values.items() if len(column) < count]
+        if short:
+            raise ValueError(f"Spawning {count} {self.name}:  too few values for {', '.join(short)}")
+        # Built column by column, so each column's kind of value is only looked at once
+        built = []
+        for cls in self.components:
+            defaults = self.defaults.get(cls, {})
+            column = values.get(cls)
+            if column is None:
+                built.append([cls(**defaults) for _ in range(count)])
+            elif all(type(value) is tuple for value in column[:count]):
+                built.append([cls(*value) for value in column[:count]])
+            elif not any(isinstance(value, (dict, tuple)) or value is None for value in column[:count]):
+                built.append([cls(value) for value in column[:count]])
+            else:
+                built.append([self._make(cls, value) for value in column[:count]])
+        return [list(components) for components in zip(*built)]
+
+    def make(self, **values: Any) -> List[C]:
+        """The components of a single entity -- one value per column"""
+        return self.build(1, **{name: [value] for name, value in values.items()})[0]
+
+
+def get_prefab(name: str) -> Prefab:
+    try:
+        return PREFABS[name]
+    except KeyError:
+        raise KeyError(f"No prefab named {name!r} (registered: {', '.join(PREFABS) or 'none'})") from None
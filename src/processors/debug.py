@@ -1,29 +1,44 @@
 from base import Processor
 from components import *
+from renderer import Renderer
+from tracing import Level, WORLD
 
 
 class DisplayProcessor(Processor):
     """
     DEBUGGING PROCESSOR
-    This just allows us to display the game grid in the console
+    This just allows us to display the game grid in the console, drawing it once per tick.
+    Only the cells that changed since the last tick are redrawn (see `Renderer`);  `run.py` draws
+    on its own thread instead, so the simulation doesn't wait on the terminal.
+    (No component access declared on purpose -- it prints, so it always runs on its own)
     """
+    def __init__(self, priority, world, **renderer):
+        super().__init__(priority, world)
+        renderer.setdefault("viewport", (world.rows, world.cols))
+        self.renderer = Renderer(world, **renderer)
+
     def process(self):
-        graph = self.world.build_graph()
-        for _, (position, display) in self.world.get_components(Position, Display):
-            graph.grid[position.x][position.y].icon = display.icon
-        for _, (region, display) in self.world.get_components(Region, Display):
-            for x, y in region.tiles:
-                graph.grid[x][y].icon = display.icon
-        print(graph)
+        self.renderer.render()
 
 
 class DebugProcessor(Processor):
     """
     DEBUGGING PROCESSOR
-    This allows us to attach messages to entities to get printed to the console
-    BELOW the printed-out game grid.
+    This prints the trace events of entities with a `Debug` component to the console
+    BELOW the printed-out game grid -- adding it turns tracing on (see `World.trace`).
+    (No component access declared on purpose -- it prints, so it always runs on its own)
     """
+    def __init__(self, priority, world, level: Level = Level.DEBUG):
+        super().__init__(priority, world)
+        if not world.trace.enabled:
+            world.trace.enable(level)
+
     def process(self):
-        for _, debug in self.world.get_component(Debug):
-            print(debug)
-            debug.messages = []
+        trace = self.world.trace
+        for entity, _ in self.world.get_component(Debug):
+            for message in trace.messages(entity):
+                print(message)
+            trace.clear(entity)
+        for message in trace.messages(WORLD):
+            print(message)
+        trace.clear(WORLD)
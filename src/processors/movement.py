@@ -1,67 +1,225 @@
-from a_star import Graph, find_path
+from collections import Counter
+from typing import Set
+
+from a_star import PathSearch, Reachability
 from base import Processor
+from hpa import HierarchicalPathfinder
+from parallel_paths import BatchPathfinder
+from paths import Path
 from components import *
+from tracing import Level
 
 
 class MovementProcessor(Processor):
     """
     What it sounds like -- handles movement of any entity that can move.  Uses the target/path for
     determining where to move to next.
+
+    All movers are stepped in one pass:  each walks its path's cursor forward (up to `speed` steps),
+    checking the nav grid's obstacle bitmap as it goes, and the new positions are applied together
+    at the end.  Movers that are obstacles themselves change the bitmap, so they're moved right away.
     """
+    reads = (Name, Obstacle)
+    writes = (Position, Movement)
+
     def process(self):
-        obstacles = self.world.get_obstacles()
-        for _, (position, movement, name, debug) in self.world.get_components(Position, Movement, Name, Debug):
-            debug.messages.append(f"Processing movement for {name.name}: {movement}")
+        debug = self.world.trace.channel(Level.DEBUG)
+        nav = self.world.nav
+        obstacles, rows, cols = nav.obstacles, nav.rows, nav.cols
+        blocking = {entity for entity, _ in self.world.get_components(Movement, Obstacle)}
+        moves: List[Tuple[Entity, int, int]] = []
+        for entity, (position, movement) in self.world.get_active_components(Position, Movement):
+            if debug:
+                debug(entity, "Processing movement for {}: target {}, {} steps left",
+                      self._name(entity), movement.target, len(movement.path))
             if not movement.target:
-                movement.path = []
+                movement.path.clear()
                 continue
-            else:  # Move along path at specified speed
-                for i in range(movement.speed):
-                    if not movement.path:
-                        break
-                    next_step = movement.path.pop(0)
-                    if next_step in obstacles:
-                        # The terrain changed, and we don't have a valid path anymore.
-                        # Clear out the invalid path so the PathfindingProcessor can give us a new one
-                        movement.path = []
-                        # We don't want to hit the `if` at the end
-                        break
-                    else:
-                        debug.messages.append(f"{name.name} moving to {next_step}")
-                        position.x, position.y = next_step
-                # Check if they reached their destination
-                if not movement.path:
-                    movement.target = None
+            path = movement.path
+            if not path:
+                # The path is still being searched for -- wait for it
+                continue
+            xs, ys, cursor, end = path.xs, path.ys, path.cursor, len(path.xs)
+            moved = None
+            # Move along path at specified speed
+            for _ in range(movement.speed):
+                if cursor == end:
+                    break
+                x, y = xs[cursor], ys[cursor]
+                cursor += 1
+                if 0 <= x < rows and 0 <= y < cols and obstacles[x * cols + y]:
+                    # The terrain changed, and we don't have a valid path anymore.
+                    # Clear out the invalid path so the PathfindingProcessor can give us a new one
+                    cursor = end
+                    break
+                if debug:
+                    debug(entity, "{} moving to {}", self._name(entity), (x, y))
+                if entity in blocking:
+                    self.world.move_entity(entity, x, y)
+                else:
+                    moved = (x, y)
+            path.cursor = cursor
+            if moved is not None:
+                moves.append((entity, *moved))
+            # Check if they reached their destination (or lost their path)
+            if cursor == end:
+                movement.path.clear()
+                movement.target = None
+        self.world.move_entities(moves)
+
+    def _name(self, entity: Entity) -> str:
+        name = self.world.get_entity_component(entity, Name)
+        return name.name if name is not None else str(entity)
 
 
 class PathfindingProcessor(Processor):
     """
     Handles setting up any Entity that can move.  If the Entity has a target location,
     This will find it a path and give it out so it can follow it in subsequent ticks.
+
+    When several movers head for the same target in one tick, they share a flow field
+    instead of each running their own A* search.
+
+    Configuration (passed through `World.add_processor`):
+        mode                    "astar" (full-grid A*) or "hpa" (hierarchical, for large maps)
+        cluster_size            Cluster width/height for "hpa"
+        flow_field_threshold    How many movers need to share a target before it gets a flow field
+        expansion_budget        A* node expansions allowed per tick across all searches (None for no limit)
+        workers                 Solve each tick's A* searches as one parallel batch over this many
+                                processes instead (None to search serially)
+
+    A* searches are resumable jobs:  whatever doesn't fit in this tick's budget carries on next tick,
+    so one long or impossible search can't stall a whole tick.
     """
-    def _build_graph(self) -> Graph:
-        obstacles = self.world.get_obstacles()
-        # Build a graph from them
-        graph = self.world.build_graph()
-        for x, y in obstacles:
-            graph.grid[x][y].obstacle = True
-        return graph
+    reads = (Position, Obstacle)
+    writes = (Movement,)
+
+    mode: str
+    flow_field_threshold: int
+    expansion_budget: Optional[int]
+    hpa: Optional[HierarchicalPathfinder]
+    batch: Optional[BatchPathfinder]
+    # Mover -> its unfinished search, in round-robin order
+    jobs: Dict[Entity, PathSearch]
+    # Nav grid cells changed since the searches were last checked against them
+    nav_changes: Set[Tuple[int, int]]
+    reachability: Reachability
+
+    def __init__(self, priority, world, mode: str = "astar", cluster_size: int = 16, flow_field_threshold: int = 4,
+                 expansion_budget: Optional[int] = 20000, workers: Optional[int] = None):
+        super().__init__(priority, world)
+        if mode not in ("astar", "hpa"):
+            raise ValueError(f"Unknown pathfinding mode: {mode}")
+        self.mode = mode
+        self.flow_field_threshold = flow_field_threshold
+        self.expansion_budget = expansion_budget
+        self.jobs = {}
+        self.nav_changes = world.nav.track_changes()
+        self.reachability = Reachability(world.nav)
+        self.hpa = HierarchicalPathfinder(world.nav, cluster_size) if mode == "hpa" else None
+        self.batch = BatchPathfinder(world.nav, workers) if workers else None
+
+    def _flow_path(self, position: Position, target: Tuple[int, int], shared: bool) -> Optional[List[Tuple[int, int]]]:
+        # Reuse any cached field that leads here, e.g. a stockpile's field
+        for field in self.world.flow_fields.containing(target):
+            path = field.path_from(position.x, position.y)
+            if path and path[-1] == target:
+                return path
+        if shared:
+            return self.world.flow_fields.get([target]).path_from(position.x, position.y)
+        return None
+
+    def _apply(self, entity: Entity, position: Position, movement: Movement, path: List[Tuple[int, int]]) -> None:
+        movement.path = Path(path)
+        if movement.path:
+            # Its chunk may be asleep -- make sure `MovementProcessor` picks it up this tick
+            self.world.wake(entity)
+        else:
+            movement.target = None
+            self.world.trace.log(Level.DEBUG, entity, "No path to target at {}", position.as_tuple())
 
     def process(self):
-        # Don't immediately build the graph just in case we don't actually need it
-        graph: Optional[Graph] = None
+        debug = self.world.trace.channel(Level.DEBUG)
+        # Every mover waiting on a path, awake or not -- a target can be set while its chunk sleeps
+        movers = {
+            entity: (position, movement)
+            for entity, (position, movement) in self.world.get_components(Position, Movement)
+            if movement.target and not movement.path
+        }
+        # Forget searches nobody is waiting on anymore (target reached/cleared, or the mover is gone)
+        for entity in [e for e in self.jobs if e not in movers]:
+            del self.jobs[entity]
+        sharing = Counter(movement.target for _, movement in movers.values())
+        batched: List[Entity] = []
         # Apply pathfinding and process movement
-        for _, (position, movement, debug) in self.world.get_components(Position, Movement, Debug):
-            if not movement.target:
+        for entity, (position, movement) in movers.items():
+            job = self.jobs.get(entity)
+            if job and (job.end_x, job.end_y) == movement.target:
+                continue  # Still being searched for
+            if debug:
+                debug(entity, "Finding path to {}", movement.target)
+            path = self._flow_path(position, movement.target, sharing[movement.target] >= self.flow_field_threshold)
+            if path is None and self.reachability.unreachable(position.x, position.y, *movement.target):
+                path = []
+            if path is None and self.hpa:
+                path = self.hpa.find_path(position.x, position.y, *movement.target)
+            if path is None and self.batch:
+                batched.append(entity)
                 continue
-            if not movement.path:
-                debug.messages.append(f"Finding path to {movement.target}")
-                # We do need the graph now
-                graph = self._build_graph() if not graph else graph
-                movement.path = find_path(
-                    graph, position.x, position.y, movement.target[0], movement.target[1]
-                )
-                if not movement.path:
-                    movement.path = []
-                    movement.target = None
-                    debug.messages.append(f"No path to target at {position}")
+            if path is None:
+                # Queue up an A* search -- it'll be run within this tick's budget below
+                self.jobs.pop(entity, None)
+                self.jobs[entity] = PathSearch(self.world.nav, position.x, position.y, *movement.target)
+                continue
+            self._apply(entity, position, movement, path)
+        if batched:
+            self._run_batch(batched, movers)
+        self._run_jobs(movers)
+        # Whoever is still waiting on a search has to be looked at again next tick
+        for entity in self.jobs:
+            self.world.wake(entity)
+
+    def _run_batch(self, batched: List[Entity], movers: Dict[Entity, Tuple[Position, Movement]]) -> None:
+        """Solves every A* search of the tick in parallel, then applies the paths in entity order"""
+        batched.sort()
+        requests = []
+        for entity in batched:
+            position, movement = movers[entity]
+            requests.append((position.x, position.y, *movement.target))
+        for entity, path in zip(batched, self.batch.solve(requests)):
+            self._apply(entity, *movers[entity], path)
+
+    def _run_jobs(self, movers: Dict[Entity, Tuple[Position, Movement]]) -> None:
+        """
+        Runs the queued searches round-robin, splitting the expansion budget evenly between them.
+        Unfinished searches go to the back of the queue and carry on next tick, even if the nav grid
+        changed meanwhile -- restarting them would starve every search whenever anything on the map
+        changes, and `MovementProcessor` already drops paths that became blocked.  A search the change
+        touched is marked stale instead:  it never records its component, and if it runs dry it's
+        started over (the change may have opened the way it was missing).
+        """
+        if self.nav_changes:
+            for job in self.jobs.values():
+                if not job.stale and job.affected_by(self.nav_changes):
+                    job.stale = True
+            self.nav_changes.clear()
+        budget = self.expansion_budget
+        nav = self.world.nav
+        while self.jobs and (budget is None or budget > 0):
+            share = None if budget is None else max(1, budget // len(self.jobs))
+            for entity in list(self.jobs):
+                job = self.jobs.pop(entity)
+                used = job.run(share if budget is None else min(share, budget))
+                if job.done and job.exhausted and job.stale:
+                    position, _ = movers[entity]
+                    self.jobs[entity] = PathSearch(nav, position.x, position.y, job.end_x, job.end_y)
+                elif job.done:
+                    if job.exhausted:
+                        self.reachability.record(job.closed)
+                    self._apply(entity, *movers[entity], job.path)
+                else:
+                    self.jobs[entity] = job
+                if budget is not None:
+                    budget -= used
+                    if budget <= 0:
+                        break
@@ -6,13 +6,33 @@ class RegionProcessor(Processor):
     """
     Handles making sure that items are registered to a Region
     if they are in a valid position to do so.
+
+    Only items whose components changed since the last tick are rechecked -- everything is
+    rechecked when a region itself is added, removed or changed.
     """
+    reads = (Position, Weight, Stockable, Region)
+    writes = (Inventory,)
+
+    def __init__(self, priority, world):
+        super().__init__(priority, world)
+        self.item_changes = world.track_changes(Position, Weight, Stockable)
+        self.region_changes = world.track_changes(Region, Inventory)
+        self.primed = False
+
     def process(self):
-        for item, (position, weight, stockable) in self.world.get_components(Position, Weight, Stockable):
-            for reg, (region, inventory) in self.world.get_components(Region, Inventory):
-                if item in inventory.contents:
-                    if (position.x, position.y) not in region.tiles:
-                        inventory.contents.remove(item)
-                else:
-                    if (position.x, position.y) in region.tiles:
-                        inventory.contents.append(item)
+        regions = self.world.regions
+        if not self.primed or self.region_changes:
+            items = [item for item, _ in self.world.get_components(Position, Weight, Stockable)]
+            # Stocked items that lost their position (picked up, destroyed) have to leave their region too
+            positioned = set(items)
+            items.extend(item for item in list(regions.item_region) if item not in positioned)
+            self.primed = True
+        else:
+            items = sorted(self.item_changes.touched())
+        for item in items:
+            position = None
+            if self.world.has_component(item, Weight) and self.world.has_component(item, Stockable):
+                position = self.world.get_entity_component(item, Position)
+            regions.update_item(item, position.as_tuple() if position else None)
+        self.item_changes.clear()
+        self.region_changes.clear()
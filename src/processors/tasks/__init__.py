@@ -1,26 +1,26 @@
 from processors.tasks.hauling import *
+from tracing import Level
 
 
 class TaskProcessor(Processor):
     """
     Handles assigning Tasks to Dwarves
+
+    The choosing itself is done by `world.tasks` (a `TaskDispatcher`), which only looks at the
+    Dwarves that need to reconsider -- this just applies whatever switches it comes up with.
     """
+    # `world.tasks` asks each task's work source whether it has work -- the hauling board looks at
+    # the items (and which region, if any, they're stocked in) and at the haulers' `Hauls`
+    reads = (Name, Position, Weight, Stockable, Region, Inventory)
+    writes = (Tasked, Hauls)
+
     def process(self):
-        for tasker, (name, tasked) in self.world.get_components(Name, Tasked):
-            priorities = [(t, p) for t, p in tasked.priorities.items()]
-            priorities.sort(key=lambda x: x[1], reverse=True)
-            # Sort tasks from highest to lowest priority
-            for (task, _) in priorities:
-                # In the loop, we look for the first task that passes the "test" for that task,
-                # Meaning the task has something for the Dwarf to do.  We then assign that task.
-                if task == Task.HAUL:
-                    if tasked.current_task != Task.HAUL:
-                        # TODO:  Somehow check that the HAUL task has anything to be done
-                        tasked.current_task = Task.HAUL
-                        self.world.add_component(tasker, Hauls(step=HaulStep.NEED_ITEM))
-                        print(f"{name.name} task set to HAUL")
-                    break
-                else:  # We found no "needed" tasks, so the Dwarf goes idle.
-                    tasked.current_task = Task.IDLE
-                    print(f"{name.name} task set to IDLE")
-                    break
+        info = self.world.trace.channel(Level.INFO)
+        for tasker, task in self.world.tasks.dispatch().items():
+            tasked = self.world.get_entity_component(tasker, Tasked)
+            name = self.world.get_entity_component(tasker, Name)
+            tasked.current_task = task
+            if task == Task.HAUL:
+                self.world.add_component(tasker, Hauls(step=HaulStep.NEED_ITEM))
+            if info:
+                info(tasker, "{} task set to {}", name.name if name is not None else tasker, task.name)
@@ -1,6 +1,8 @@
 from a_star import heuristic, Node
 from base import Processor
 from components import *
+from hauling_board import HaulingBoard
+from tracing import Level
 
 
 class StockingProcessor(Processor):
@@ -14,51 +16,55 @@ class StockingProcessor(Processor):
     4) Region assigned;     Need to move to it
     5) Region found;        Drop off the item
     """
+    reads = (Weight, Stockable, Region, Tasked, Name)
+    writes = (Position, Movement, Inventory, MaxCarry, Hauls)
 
-    def _find_closest_item(self, pos: Position, carry: MaxCarry, stockpiled_items: List[Entity]) -> Tuple[
-        Entity, Optional[Position]]:
-        closest: Tuple[int, Optional[Position], int] = (-1, None, 999999)
-        for item, (i_pos, weight, stockable) in self.world.get_components(Position, Weight, Stockable):
-            if item in stockpiled_items:
-                continue
-            if carry.current_weight + weight.weight > carry.max_weight:
-                continue
-            dist = heuristic(Node(x=i_pos.x, y=i_pos.y), Node(x=pos.x, y=pos.y))
-            if dist < closest[2]:
-                closest = (item, i_pos, dist)
-        return closest[0], closest[1]
+    def __init__(self, priority, world):
+        super().__init__(priority, world)
+        self.board = HaulingBoard(world)
+        world.tasks.add_source(Task.HAUL, self.board)
 
     def _find_closest_region(self, pos: Position) -> Tuple[Entity, Optional[Position]]:
         closest: Tuple[int, Optional[Position], int] = (-1, None, 999999)
-        for region, (reg, _) in self.world.get_components(Region, Inventory):
-            # Find the closest valid tile within the region
-            for (x, y) in reg.tiles:
-                dist = heuristic(Node(x=x, y=y), Node(x=pos.x, y=pos.y))
+        regions = self.world.regions
+        tiles = regions.all_tiles()
+        if tiles:
+            # One field seeded from every region tile, shared by every hauler -- the tile it leads to
+            # is the closest by true walking distance, and the region that owns it is the closest region
+            goal = self.world.flow_fields.get(tiles).goal_from(pos.x, pos.y)
+            region = regions.region_at(*goal) if goal is not None else None
+            if region is not None and self.world.has_component(region, Inventory):
+                closest = (region, Position(*goal), 0)
+        if closest[1] is None:
+            # No region can be reached -- fall back to the closest free tile as the crow flies
+            for region, _ in self.world.get_components(Region, Inventory):
+                tile = regions.nearest_tile(region, pos.x, pos.y, free=True)
+                if tile is None:
+                    continue
+                dist = heuristic(Node(x=tile[0], y=tile[1]), Node(x=pos.x, y=pos.y))
                 if dist < closest[2]:
-                    closest = (region, Position(x=x, y=y), dist)
+                    closest = (region, Position(*tile), dist)
         return closest[0], closest[1]
 
-    def _get_stockpiled_items(self) -> List[Entity]:
-        stockpiled_items: List[Entity] = []
-        for _, (_, inventory) in self.world.get_components(Region, Inventory):
-            stockpiled_items.extend(inventory.contents)
-            stockpiled_items = list(set(stockpiled_items))
-        return stockpiled_items
-
     def process(self):
-        stockpiled_items = None
-        for hauler, (pos, movement, inventory, carry, tasked, hauls, name, debug) in self.world.get_components(
-                Position, Movement, Inventory, MaxCarry, Tasked, Hauls, Name, Debug
-        ):
+        debug = self.world.trace.channel(Level.DEBUG)
+        haulers = self.world.get_active_components(Position, Movement, Inventory, MaxCarry, Tasked, Hauls, Name)
+        # Everyone who needs an item is handed one at once, from the job board
+        assigned = self.board.assign([
+            (hauler, pos, carry.max_weight - carry.current_weight)
+            for hauler, (pos, _, _, carry, tasked, hauls, _) in haulers
+            if tasked.current_task == Task.HAUL and hauls.step == HaulStep.NEED_ITEM
+        ])
+        for hauler, (pos, movement, inventory, carry, tasked, hauls, name) in haulers:
             if tasked.current_task != Task.HAUL:
                 self.world.remove_component(hauler, Hauls)
                 continue
             # 1) No item assigned;  Find the closest one
             if hauls.step == HaulStep.NEED_ITEM:
-                debug.messages.append(f"{name.name} needs an item")
-                if stockpiled_items is None:
-                    stockpiled_items = self._get_stockpiled_items()
-                item, item_pos = self._find_closest_item(pos, carry, stockpiled_items)
+                if debug:
+                    debug(hauler, "{} needs an item", name.name)
+                item = assigned.get(hauler, -1)
+                item_pos = self.world.get_entity_component(item, Position) if item != -1 else None
                 if inventory.contents:
                     if not item_pos:  # Not full inventory, but also nothing to pick up
                         hauls.step = HaulStep.NEED_REGION
@@ -69,19 +75,22 @@ class StockingProcessor(Processor):
                     dist_to_item = heuristic(Node(x=pos.x, y=pos.y), Node(x=item_pos.x, y=item_pos.y))
                     if dist_to_region < dist_to_item:
                         # Go drop things off first
+                        self.board.release(item)
                         hauls.step = HaulStep.NEED_REGION
                         continue
                 else:
                     # No items to drop off, and no items to pick up -- time to do something else?
                     if not item_pos:
-                        # TODO:  SOMEHOW CHANGE TO NEXT PRIORITY TASK?
+                        # Nothing left to haul -- let the dispatcher move on to the next priority task
+                        self.world.tasks.finished(hauler)
                         continue
-                debug.messages.append(f"Found {item} at {item_pos}")
+                if debug:
+                    debug(hauler, "Found {} at {}", item, item_pos.as_tuple())
                 movement.target = item_pos.as_tuple()
-                stockpiled_items.append(item)
                 hauls.step = HaulStep.FIND_ITEM
                 hauls.items.append(item)
-                debug.messages.append(f"Hauling {hauls}")
+                if debug:
+                    debug(hauler, "Hauling {} ({})", tuple(hauls.items), hauls.step.name)
             # 2) Item assigned; need to move to it and pick it up
             if hauls.step == HaulStep.FIND_ITEM:
                 if not hauls.items:
@@ -89,25 +98,30 @@ class StockingProcessor(Processor):
                 else:
                     item = hauls.items[-1]
                     item_pos = self.world.get_entity_component(item, Position)
-                    debug.messages.append(f"{name.name} looking for item at {pos}...")
+                    if debug:
+                        debug(hauler, "{} looking for item at {}...", name.name, pos.as_tuple())
                     if not item_pos or (pos == movement.target and item_pos != movement.target):
-                        debug.messages.append(f"Moved to {item_pos}, where'd it go??")
+                        if debug:
+                            debug(hauler, "Moved to {}, where'd it go??", item_pos.as_tuple() if item_pos else None)
                         # The item moved since we set it.  Find a new item instead.
-                        hauls.items.pop()
+                        self.board.release(hauls.items.pop())
                         hauls.step = HaulStep.NEED_ITEM
                         movement.target = None
-                        movement.path = []
+                        movement.path.clear()
                         continue
                     if pos == item_pos:
                         # Found the item; standing on it; pick it up.
-                        debug.messages.append(f"Arrived at {pos}; picking up {item}")
+                        if debug:
+                            debug(hauler, "Arrived at {}; picking up {}", pos.as_tuple(), item)
                         i_weight = self.world.get_entity_component(item, Weight)
                         if carry.current_weight + i_weight.weight > carry.max_weight:
                             hauls.step = HaulStep.NEED_ITEM
-                            hauls.items.pop()
+                            self.board.release(hauls.items.pop())
                         else:
+                            self.board.picked_up(item)
                             carry.current_weight += i_weight.weight
-                            debug.messages.append(f"Adding {item} to inventory!")
+                            if debug:
+                                debug(hauler, "Adding {} to inventory!", item)
                             inventory.contents.append(item)
                             self.world.remove_component(item, Position)
                             if carry.current_weight < carry.max_weight:
@@ -115,23 +129,25 @@ class StockingProcessor(Processor):
                             else:
                                 hauls.step = HaulStep.NEED_REGION
                         movement.target = None
-                        movement.path = []
+                        movement.path.clear()
             # 3) Item picked up; need to find the closest region to bring it to
             if hauls.step == HaulStep.NEED_REGION:
-                debug.messages.append(f"{name.name} needs a region")
+                if debug:
+                    debug(hauler, "{} needs a region", name.name)
                 region, region_pos = self._find_closest_region(pos)
-                debug.messages.append(f"Found {region} at {region_pos}")
+                if debug:
+                    debug(hauler, "Found {} at {}", region, region_pos.as_tuple())
                 movement.target = region_pos.as_tuple()
                 hauls.step = HaulStep.FIND_REGION
                 hauls.region = region
             # 4) Region assigned; need to move to it
             if hauls.step == HaulStep.FIND_REGION:
-                debug.messages.append(f"{name.name} looking for region tile at {movement.target}")
+                if debug:
+                    debug(hauler, "{} looking for region tile at {}", name.name, movement.target)
                 if not hauls.region:
                     hauls.step = HaulStep.NEED_ITEM if not hauls.item else HaulStep.NEED_REGION
                 else:
-                    region = self.world.get_entity_component(hauls.region, Region)
-                    if movement.target not in region.tiles:
+                    if not movement.target or self.world.regions.region_at(*movement.target) != hauls.region:
                         # The region no longer has a tile there, find a new one
                         region, region_pos = self._find_closest_region(pos)
                         movement.target = region_pos.as_tuple()
@@ -139,7 +155,8 @@ class StockingProcessor(Processor):
                     if pos == movement.target:
                         # 5) Region found; drop off the items
                         for item in hauls.items:
-                            debug.messages.append(f"Arrived at {pos}; dropping off {item}")
+                            if debug:
+                                debug(hauler, "Arrived at {}; dropping off {}", pos.as_tuple(), item)
                             i_weight = self.world.get_entity_component(item, Weight)
                             carry.current_weight -= i_weight.weight
                             inventory.contents.remove(item)
@@ -147,7 +164,11 @@ class StockingProcessor(Processor):
                         hauls.step = HaulStep.NEED_ITEM
                         hauls.items = []
                         movement.target = None
-                        movement.path = []
+                        movement.path.clear()
+        # Haulers still picking their next item or region aren't moving -- keep their chunks awake
+        for hauler, (_, movement, _, _, _, hauls, _) in haulers:
+            if hauls.step in (HaulStep.NEED_ITEM, HaulStep.NEED_REGION) or (movement.target and not movement.path):
+                self.world.wake(hauler)
 
 
 class HaulingProcessor(Processor):
@@ -155,27 +176,37 @@ class HaulingProcessor(Processor):
     Handles Entities that can carry items -- picking up and putting down items when applicable.
     THIS WILL CHANGE SIGNIFICANTLY EVENTUALLY.  Right now it's as basic as possible.
     """
+    reads = (Weight, Name)
+    writes = (Position, Inventory, MaxCarry)
+
     def process(self):
-        for _, (position, inventory, carry, name, debug) in self.world.get_components(Position, Inventory, MaxCarry, Name, Debug):
+        debug = self.world.trace.channel(Level.DEBUG)
+        for entity, (position, inventory, carry, name) in self.world.get_components(Position, Inventory, MaxCarry, Name):
             space_empty = True
-            for item, (i_position, weight, i_name) in self.world.get_components(Position, Weight, Name):
-                if not (position.x == i_position.x and position.y == i_position.y):
+            for item in self.world.entities_at(position.x, position.y):
+                weight = self.world.get_entity_component(item, Weight)
+                i_name = self.world.get_entity_component(item, Name)
+                if not weight or not i_name:
                     continue
                 space_empty = False
-                debug.messages.append(f"{name.name} found a {i_name.name}!")
+                if debug:
+                    debug(entity, "{} found a {}!", name.name, i_name.name)
                 if carry.current_weight + weight.weight > carry.max_weight:
-                    debug.messages.append(f"{name.name} can not fit the {i_name.name} in their inventory!")
+                    if debug:
+                        debug(entity, "{} can not fit the {} in their inventory!", name.name, i_name.name)
                     continue
                 # Move the item into the inventory
                 inventory.contents.append(item)
                 carry.current_weight += weight.weight
                 # The object is being carried so it no longer has a position of its own
                 self.world.remove_component(item, Position)
-                debug.messages.append(f"{name.name} picked up the {i_name.name}  ({carry})")
+                if debug:
+                    debug(entity, "{} picked up the {}  ({})", name.name, i_name.name, str(carry))
             if space_empty and inventory.contents:
                 drop = inventory.contents.pop()
                 carry.current_weight -= self.world.get_entity_component(drop, Weight).weight
                 item_name = self.world.get_entity_component(drop, Name)
                 # item is no longer being carried; give it a position again
                 self.world.add_component(drop, Position(x=position.x, y=position.y))
-                debug.messages.append(f"{name.name} dropped {item_name.name} at {position}  ({carry})")
+                if debug:
+                    debug(entity, "{} dropped {} at {}  ({})", name.name, item_name.name, position.as_tuple(), str(carry))
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, fields
+from typing import Deque, Dict, List, Optional
+
+from base import Processor
+
+"""
+Opt-in instrumentation for `World.process`:  per-processor wall time and query activity, kept
+over a rolling window of ticks.  Switch it on with `World.enable_profiling`; while it's off the
+world only pays for an `is None` check in the query methods.
+"""
+
+# Counters for anything that happens outside a processor (setup, `kill_entities`, ...)
+OUTSIDE = "(world)"
+
+
+@dataclass
+class Sample:
+    """What one processor did in one tick"""
+    seconds: float = 0.0
+    get_components: int = 0
+    get_component: int = 0
+    # Query snapshots reused as-is vs. rebuilt (or registered) because the matches changed
+    hits: int = 0
+    misses: int = 0
+    # `World.clear_caches` calls, which drop every registered query
+    invalidations: int = 0
+    # Total length of the query results handed out
+    entities: int = 0
+
+
+class Profiler:
+    window: int
+    # Print a summary every this many ticks (None to never print)
+    report_every: Optional[int]
+    ticks: int
+    # Processor name -> its samples for the last `window` ticks, oldest first
+    stats: Dict[str, Deque[Sample]]
+    # Each thread counts into the sample of the processor it's running
+    _local: threading.local
+
+    def __init__(self, window: int = 120, report_every: Optional[int] = None) -> None:
+        self.window = window
+        self.report_every = report_every
+        self.ticks = 0
+        self.stats = {}
+        self._local = threading.local()
+
+    # ---- Recording Functions ---- #
+    def _window(self, name: str) -> Deque[Sample]:
+        try:
+            return self.stats[name]
+        except KeyError:
+            return self.stats.setdefault(name, deque(maxlen=self.window))
+
+    def _current(self) -> Sample:
+        sample = getattr(self._local, "sample", None)
+        if sample is None:
+            # Outside of any processor -- counted against the world for the tick in progress
+            samples = self._window(OUTSIDE)
+            if not samples or getattr(self._local, "tick", None) != self.ticks:
+                samples.append(Sample())
+                self._local.tick = self.ticks
+            sample = samples[-1]
+        return sample
+
+    def run(self, processor: Processor) -> None:
+        """Runs the processor, recording everything it does into this tick's sample for it"""
+        sample = self._local.sample = Sample()
+        start = time.perf_counter()
+        try:
+            processor.process()
+        finally:
+            sample.seconds = time.perf_counter() - start
+            self._local.sample = None
+            self._window(type(processor).__name__).append(sample)
+
+    def query(self, single: bool, hit: bool, entities: int) -> None:
+        sample = self._current()
+        if single:
+            sample.get_component += 1
+        else:
+            sample.get_components += 1
+        if hit:
+            sample.hits += 1
+        else:
+            sample.misses += 1
+        sample.entities += entities
+
+    def invalidated(self) -> None:
+        self._current().invalidations += 1
+
+    def end_tick(self) -> None:
+        self.ticks += 1
+        if self.report_every and self.ticks % self.report_every == 0:
+            print(self.format())
+
+    # ---- Reporting Functions ---- #
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per processor, over the window:  mean and max wall time, and the mean per tick of every counter.
+        Processors are listed slowest first.
+        """
+        result: Dict[str, Dict[str, float]] = {}
+        for name, samples in self.stats.items():
+            if not samples:
+                continue
+            stats = {"ticks": len(samples), "max_seconds": max(s.seconds for s in samples)}
+            for f in fields(Sample):
+                stats[f.name] = sum(getattr(s, f.name) for s in samples) / len(samples)
+            result[name] = stats
+        return dict(sorted(result.items(), key=lambda item: item[1]["seconds"], reverse=True))
+
+    def format(self) -> str:
+        lines: List[str] = [
+            f"Profile (last {self.window} ticks, mean per tick)",
+            f"{'processor':<24} {'ms':>9} {'max ms':>9} {'get_cs':>7} {'get_c':>6} "
+            f"{'hits':>6} {'misses':>6} {'inval':>6} {'entities':>9}",
+        ]
+        for name, s in self.summary().items():
+            lines.append(
+                f"{name:<24} {s['seconds'] * 1000:>9.3f} {s['max_seconds'] * 1000:>9.3f} {s['get_components']:>7.1f} "
+                f"{s['get_component']:>6.1f} {s['hits']:>6.1f} {s['misses']:>6.1f} {s['invalidations']:>6.1f} "
+                f"{s['entities']:>9.1f}"
+            )
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        self.stats.clear()
@@ -0,0 +1,65 @@
+from typing import Dict, Iterable, List, Type, Optional, Tuple
+
+from base import C, Entity
+
+
+class Query:
+    """
+    A registered query over a fixed set of component types.
+
+    `World` keeps the matching entities up to date as components are added and removed,
+    so reading a query never rescans the world -- it only touches entities that changed.
+    """
+    components: Tuple[Type[C], ...]
+    matches: Dict[Entity, List[C]]
+    # Snapshots handed out to callers, rebuilt lazily after the matches change
+    _result: Optional[List[Tuple[Entity, List[C]]]]
+    _single: Optional[List[Tuple[Entity, C]]]
+
+    def __init__(self, components: Tuple[Type[C], ...]) -> None:
+        self.components = components
+        self.matches = {}
+        self._result = None
+        self._single = None
+
+    def __len__(self) -> int:
+        return len(self.matches)
+
+    def __contains__(self, entity: Entity) -> bool:
+        return entity in self.matches
+
+    def fresh(self, single: bool = False) -> bool:
+        """True if the next `result` (or `single_result`) reuses the last snapshot instead of rebuilding it"""
+        return (self._single if single else self._result) is not None
+
+    def _changed(self) -> None:
+        self._result = None
+        self._single = None
+
+    def set(self, entity: Entity, components: List[C]) -> None:
+        self.matches[entity] = components
+        self._changed()
+
+    def update(self, matches: Iterable[Tuple[Entity, List[C]]]) -> None:
+        """Sets many matches at once (the snapshots are only invalidated once)"""
+        self.matches.update(matches)
+        self._changed()
+
+    def discard(self, entity: Entity) -> None:
+        if self.matches.pop(entity, None) is not None:
+            self._changed()
+
+    def result(self) -> List[Tuple[Entity, List[C]]]:
+        """
+        The matches as a list -- a snapshot, so callers can safely add/remove components
+        while iterating over it.
+        """
+        if self._result is None:
+            self._result = list(self.matches.items())
+        return self._result
+
+    def single_result(self) -> List[Tuple[Entity, C]]:
+        """The matches of a single-component query, without the wrapping list"""
+        if self._single is None:
+            self._single = [(entity, comps[0]) for entity, comps in self.matches.items()]
+        return self._single
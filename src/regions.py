@@ -0,0 +1,144 @@
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from base import Entity
+from changes import Changes
+from components import Region, Inventory
+
+"""
+Index over every `Region` in the world, so stockpile bookkeeping never scans tile or content lists:
+
+    tile -> region          which region (if any) a tile belongs to
+    region -> tiles         each region's tiles as a set
+    item -> region          which region an item is stocked in, kept alongside `Inventory.contents`
+
+A tile belongs to at most one region -- if regions overlap, the one indexed first keeps the tile.
+"""
+
+Coords = Tuple[int, int]
+
+
+class RegionIndex:
+    world: object
+    tile_region: Dict[Coords, Entity]
+    tiles: Dict[Entity, FrozenSet[Coords]]
+    item_region: Dict[Entity, Entity]
+    # Region -> number of stocked items on each of its tiles (tiles missing here are free)
+    occupied: Dict[Entity, Dict[Coords, int]]
+    # Where each stocked item was put, so it can be taken off the right tile
+    item_tile: Dict[Entity, Coords]
+    # Every indexed tile -- None until asked for after the regions changed
+    _all_tiles: Optional[FrozenSet[Coords]]
+    changes: Changes
+
+    def __init__(self, world) -> None:
+        self.world = world
+        self.tile_region = {}
+        self.tiles = {}
+        self.item_region = {}
+        self.occupied = {}
+        self.item_tile = {}
+        self._all_tiles = None
+        self.changes = world.track_changes(Region)
+
+    # ---- Indexing Functions ---- #
+    def refresh(self) -> None:
+        """Re-indexes the regions that were added, removed or changed since the last call"""
+        if not self.changes:
+            return
+        for region in sorted(self.changes.touched()):
+            self._unindex(region)
+            component = self.world.get_entity_component(region, Region)
+            if component is not None:
+                self._index(region, component)
+        self.changes.clear()
+        self._all_tiles = None
+
+    def _index(self, region: Entity, component: Region) -> None:
+        tiles = frozenset(component.tiles)
+        self.tiles[region] = tiles
+        self.occupied[region] = {}
+        for tile in tiles:
+            self.tile_region.setdefault(tile, region)
+
+    def _unindex(self, region: Entity) -> None:
+        for tile in self.tiles.pop(region, ()):
+            if self.tile_region.get(tile) == region:
+                del self.tile_region[tile]
+        self.occupied.pop(region, None)
+        inventory = self.world.get_entity_component(region, Inventory)
+        for item in [i for i, r in self.item_region.items() if r == region]:
+            del self.item_region[item]
+            self.item_tile.pop(item, None)
+            if inventory is not None:
+                inventory.contents.discard(item)
+
+    # ---- Lookup Functions ---- #
+    def region_at(self, x: int, y: int) -> Optional[Entity]:
+        self.refresh()
+        return self.tile_region.get((x, y))
+
+    def region_of(self, item: Entity) -> Optional[Entity]:
+        """The region the item is stocked in, if any"""
+        return self.item_region.get(item)
+
+    def tiles_of(self, region: Entity) -> FrozenSet[Coords]:
+        self.refresh()
+        return self.tiles.get(region, frozenset())
+
+    def all_tiles(self) -> FrozenSet[Coords]:
+        """Every tile of every region, e.g. to seed one flow field that leads to whichever region is closest"""
+        self.refresh()
+        if self._all_tiles is None:
+            self._all_tiles = frozenset(self.tile_region)
+        return self._all_tiles
+
+    def nearest_tile(self, region: Entity, x: int, y: int, free: bool = False) -> Optional[Coords]:
+        """
+        The region's tile closest to (x, y) as the crow flies.  With `free`, tiles that already hold
+        a stocked item are skipped -- unless every tile does, then the closest tile is given anyway.
+        """
+        tiles = self.tiles_of(region)
+        if free:
+            occupied = self.occupied[region]
+            free_tiles = [t for t in tiles if t not in occupied] if len(occupied) < len(tiles) else []
+            tiles = free_tiles or tiles
+        if not tiles:
+            return None
+        return min(tiles, key=lambda t: (abs(t[0] - x) + abs(t[1] - y), t))
+
+    # ---- Membership Functions ---- #
+    def add_item(self, region: Entity, item: Entity, tile: Coords) -> None:
+        """Stocks the item in the region (and its `Inventory`)"""
+        if self.item_region.get(item) == region:
+            return
+        self.remove_item(item)
+        inventory = self.world.get_entity_component(region, Inventory)
+        if inventory is not None:
+            inventory.contents.append(item)
+        self.item_region[item] = region
+        self.item_tile[item] = tile
+        occupied = self.occupied[region]
+        occupied[tile] = occupied.get(tile, 0) + 1
+
+    def remove_item(self, item: Entity) -> None:
+        region = self.item_region.pop(item, None)
+        if region is None:
+            return
+        inventory = self.world.get_entity_component(region, Inventory)
+        if inventory is not None:
+            inventory.contents.discard(item)
+        tile = self.item_tile.pop(item)
+        occupied = self.occupied[region]
+        occupied[tile] -= 1
+        if not occupied[tile]:
+            del occupied[tile]
+
+    def update_item(self, item: Entity, position: Optional[Coords]) -> None:
+        """Moves the item into whichever region it now stands in (or out of them all)"""
+        self.refresh()
+        region = self.tile_region.get(position) if position is not None else None
+        if region is None:
+            self.remove_item(item)
+        elif self.item_region.get(item) != region or self.item_tile.get(item) != position:
+            self.remove_item(item)
+            self.add_item(region, item, position)
@@ -0,0 +1,107 @@
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Type
+
+from base import C
+
+"""
+The component registry.
+
+`@component` turns a class into a slotted dataclass -- no per-instance `__dict__`, so instances are
+smaller and attribute access is a slot lookup -- and registers it with a small integer type ID,
+handed out in registration order.  Storage uses the IDs for archetype signatures (see `type_mask`).
+
+    @component                  slotted and mutable
+    @component(frozen=True)     slotted and immutable, for components that never change after spawning
+
+Classes that weren't registered (plain dataclasses, say) still work everywhere:  they get an ID the
+first time one is asked for.
+"""
+
+
+class ComponentType:
+    cls: type
+    id: int
+    frozen: bool
+    # The regular (dict-backed) dataclass the slotted class was made from -- for comparisons only
+    plain: Optional[type]
+
+    def __init__(self, cls: type, id: int, frozen: bool = False, plain: Optional[type] = None) -> None:
+        self.cls = cls
+        self.id = id
+        self.frozen = frozen
+        self.plain = plain
+
+    @property
+    def slotted(self) -> bool:
+        return "__dict__" not in dir(self.cls)
+
+    @property
+    def size(self) -> int:
+        """Bytes per instance, not counting what its fields point to (or its `__dict__`, if it has one)"""
+        # The fixed part of the object, plus the garbage collector's header that `sys.getsizeof` counts
+        return self.cls.__basicsize__ + (sys.getsizeof(()) - tuple.__basicsize__)
+
+    def __repr__(self) -> str:
+        return f"ComponentType({self.cls.__name__}, id={self.id})"
+
+
+# Type ID -> component type
+COMPONENT_TYPES: List[ComponentType] = []
+_registered: Dict[type, ComponentType] = {}
+
+
+def _register(cls: type, frozen: bool = False, plain: Optional[type] = None) -> ComponentType:
+    info = _registered[cls] = ComponentType(cls, len(COMPONENT_TYPES), frozen, plain)
+    COMPONENT_TYPES.append(info)
+    return info
+
+
+def component(cls: Optional[Type[C]] = None, *, frozen: bool = False):
+    """Makes `cls` a registered, slotted dataclass -- usable bare (`@component`) or configured"""
+    def wrap(cls: Type[C]) -> Type[C]:
+        # `dataclass(slots=True)` fills in `cls` itself, then builds the slotted class from it
+        slotted = dataclass(cls, frozen=frozen, slots=True)
+        _register(slotted, frozen, plain=cls)
+        return slotted
+
+    return wrap if cls is None else wrap(cls)
+
+
+def component_type(cls: type) -> ComponentType:
+    try:
+        return _registered[cls]
+    except KeyError:
+        return _register(cls)
+
+
+def type_id(cls: type) -> int:
+    try:
+        return _registered[cls].id
+    except KeyError:
+        return _register(cls).id
+
+
+def type_mask(components) -> int:
+    """A set of component types as a bitmask of their type IDs"""
+    mask = 0
+    for cls in components:
+        mask |= 1 << type_id(cls)
+    return mask
+
+
+def footprint(instance: Any) -> int:
+    """Bytes used by a component instance itself, including its `__dict__` if it has one"""
+    size = sys.getsizeof(instance)
+    if hasattr(instance, "__dict__"):
+        size += sys.getsizeof(instance.__dict__)
+    return size
+
+
+def describe() -> str:
+    """Every registered component type with its ID, layout and instance size"""
+    lines = [f"{'id':>3}  {'component':<14}{'layout':<16}{'bytes':>6}"]
+    for info in COMPONENT_TYPES:
+        layout = ("slots" if info.slotted else "dict") + (", frozen" if info.frozen else "")
+        lines.append(f"{info.id:>3}  {info.cls.__name__:<14}{layout:<16}{info.size:>6}")
+    return "\n".join(lines)
@@ -0,0 +1,144 @@
+import shutil
+import sys
+import threading
+import time
+from typing import List, Optional, TextIO, Tuple
+
+from components import Position, Display, Region
+from grid import CLEAR, RESET, POS
+
+"""
+Differential terminal renderer.
+
+Keeps the last frame it drew, and on every new frame only moves the cursor to (and rewrites) the
+cells that changed.  The map is shown through a viewport, so maps bigger than the terminal work,
+and it can draw on its own thread at its own frame rate -- the simulation never waits on the terminal.
+"""
+
+FLOOR = "░"
+# Rows/columns taken up by the border around the map
+BORDER = 2
+
+
+class Renderer:
+    world: object
+    # Top-left map tile shown, and how many rows/columns of the map are shown
+    origin: Tuple[int, int]
+    viewport: Tuple[int, int]
+    fps: float
+    # Where frames are written (None = whatever `sys.stdout` is at the time)
+    out: Optional[TextIO]
+    # What's currently on the terminal, one icon per viewport cell -- None until the first frame
+    frame: Optional[List[List[str]]]
+    frames: int
+    _thread: Optional[threading.Thread]
+    _stop: threading.Event
+
+    def __init__(self, world, viewport: Optional[Tuple[int, int]] = None, origin: Tuple[int, int] = (0, 0),
+                 fps: float = 10, out: Optional[TextIO] = None) -> None:
+        self.world = world
+        if viewport is None:
+            # As much of the map as fits in the terminal
+            size = shutil.get_terminal_size()
+            viewport = (max(1, size.lines - BORDER - 1), max(1, size.columns - BORDER))
+        self.viewport = (min(viewport[0], world.rows), min(viewport[1], world.cols))
+        self.origin = origin
+        self.fps = fps
+        self.out = out
+        self.frame = None
+        self.frames = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    # ---- Viewport Functions ---- #
+    def scroll_to(self, x: int, y: int) -> None:
+        """Moves the viewport's top-left corner to (x, y), kept on the map"""
+        rows, cols = self.viewport
+        self.origin = (max(0, min(x, self.world.rows - rows)), max(0, min(y, self.world.cols - cols)))
+
+    def center_on(self, x: int, y: int) -> None:
+        self.scroll_to(x - self.viewport[0] // 2, y - self.viewport[1] // 2)
+
+    # ---- Drawing Functions ---- #
+    def capture(self) -> List[List[str]]:
+        """The viewport's icons right now -- entities on the floor, regions on top (like `DisplayProcessor`)"""
+        rows, cols = self.viewport
+        x0, y0 = self.origin
+        frame = [[FLOOR] * cols for _ in range(rows)]
+        with self.world.lock:
+            for _, (position, display) in self.world.get_components(Position, Display):
+                x, y = position.x - x0, position.y - y0
+                if 0 <= x < rows and 0 <= y < cols:
+                    frame[x][y] = display.icon
+            for _, (region, display) in self.world.get_components(Region, Display):
+                for tx, ty in region.tiles:
+                    x, y = tx - x0, ty - y0
+                    if 0 <= x < rows and 0 <= y < cols:
+                        frame[x][y] = display.icon
+        return frame
+
+    def _border(self) -> str:
+        rows, cols = self.viewport
+        lines = [f"┌{'─' * cols}┐"]
+        lines.extend(f"│{' ' * cols}│" for _ in range(rows))
+        lines.append(f"└{'─' * cols}┘")
+        return POS.format(row=1, col=1) + "\n".join(lines)
+
+    def diff(self, frame: List[List[str]]) -> str:
+        """The escape codes and icons that turn the last frame into `frame`"""
+        parts: List[str] = []
+        if self.frame is None or len(self.frame) != len(frame) or len(self.frame[0]) != len(frame[0]):
+            # First frame (or the viewport was resized) -- redraw everything
+            parts.extend((RESET, CLEAR, self._border()))
+            previous = None
+        else:
+            previous = self.frame
+        for x, row in enumerate(frame):
+            old_row = previous[x] if previous is not None else None
+            run_start = -1
+            for y, icon in enumerate(row):
+                if old_row is not None and old_row[y] == icon:
+                    run_start = -1
+                    continue
+                # Consecutive changed cells only need the cursor moved once
+                if run_start == -1:
+                    parts.append(POS.format(row=x + 2, col=y + 2))
+                    run_start = y
+                parts.append(icon)
+        if parts:
+            parts.append(POS.format(row=len(frame) + BORDER + 1, col=1))
+        return "".join(parts)
+
+    def render(self) -> None:
+        """Draws one frame, writing only what changed since the last one"""
+        frame = self.capture()
+        output = self.diff(frame)
+        if output:
+            out = self.out or sys.stdout
+            out.write(output)
+            out.flush()
+        self.frame = frame
+        self.frames += 1
+
+    # ---- Threading Functions ---- #
+    def _loop(self) -> None:
+        interval = 1 / self.fps
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            self.render()
+            self._stop.wait(max(0.0, interval - (time.perf_counter() - start)))
+
+    def start(self) -> None:
+        """Draws at `fps` frames a second on a background thread until `stop`"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="renderer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
@@ -0,0 +1,50 @@
+from typing import List, Set, Tuple
+
+from world import World
+from processors import *
+from components import *
+from entities import *
+
+"""
+World setup shared by the interactive runner (`run.py`) and the headless one (`headless.py`).
+"""
+
+
+def populate(world: World, dorfs: int = 2, walls: int = 30, socks: int = 30) -> None:
+    """Dwarves, walls, socks and a sock stockpile at random (free) spots on the map"""
+    used: Set[Tuple[int, int]] = set()
+
+    def spots(count: int) -> List[Tuple[int, int]]:
+        coords = []
+        for _ in range(count):
+            coords.append(world.random_coords(used))
+            used.add(coords[-1])
+        return coords
+
+    # The first two dwarves are always Urist and Bronzi, in opposite corners
+    names = ["Urist", "Bronzi"]
+    corners = [(0, 0), (world.rows - 1, world.cols - 1)][:dorfs]
+    used.update(corners)
+    world.add_entities(
+        DORF, dorfs,
+        Position=corners + spots(dorfs - len(corners)),
+        Name=[names[i] if i < len(names) else f"Dorf {i + 1}" for i in range(dorfs)],
+        Display=["☺☻"[i % 2] for i in range(dorfs)],
+    )
+    world.add_entities(WALL, walls, Position=spots(walls))
+    world.add_entities(SOCK, socks, Position=spots(socks), Name=[f"Sock {i + 1}" for i in range(socks)])
+    world.add_entities(STOCKPILE, 1, Name=["Sock Stockpile"], Region=[{"tiles": spots(1)}])
+
+
+def add_processors(world: World, display: bool = True, **pathfinding) -> None:
+    """The standard processor line-up;  `pathfinding` is passed on as `PathfindingProcessor` configuration"""
+    world.add_processor(TaskProcessor)
+    # Various Processors for Tasks
+    world.add_processor(StockingProcessor)
+    # Finalizing Tasks (Movement, etc)
+    world.add_processor(PathfindingProcessor, **pathfinding)
+    world.add_processor(MovementProcessor)
+    world.add_processor(RegionProcessor)
+    # NOTE: ALWAYS DO THESE LAST (for now)
+    if display:
+        world.add_processor(DisplayProcessor)
@@ -0,0 +1,71 @@
+from typing import List, Set
+
+from base import Processor
+
+"""
+Turns the priority-ordered processor list into stages of processors that can safely run
+side by side.  Two processors conflict when one writes a component type the other reads or
+writes, or when either hasn't declared its component access at all.
+"""
+
+
+def _names(components: Set[type]) -> str:
+    return ", ".join(sorted(c.__name__ for c in components))
+
+
+def declared(processor: Processor) -> bool:
+    return bool(processor.reads or processor.writes)
+
+
+def conflicts(first: Processor, second: Processor) -> List[str]:
+    """Every reason the two processors can't run at the same time (empty if they can)"""
+    reasons: List[str] = []
+    for processor in (first, second):
+        if not declared(processor):
+            reasons.append(f"{type(processor).__name__} doesn't declare its component access")
+    if reasons:
+        return reasons
+    first_reads, first_writes = set(first.reads), set(first.writes)
+    second_reads, second_writes = set(second.reads), set(second.writes)
+    if first_writes & second_writes:
+        reasons.append(f"both write {_names(first_writes & second_writes)}")
+    if first_writes & (second_reads - second_writes):
+        reasons.append(f"{type(first).__name__} writes {_names(first_writes & second_reads)} "
+                       f"which {type(second).__name__} reads")
+    if second_writes & (first_reads - first_writes):
+        reasons.append(f"{type(second).__name__} writes {_names(second_writes & first_reads)} "
+                       f"which {type(first).__name__} reads")
+    return reasons
+
+
+def build_stages(processors: List[Processor]) -> List[List[Processor]]:
+    """
+    Each processor goes in the stage right after the last one holding a processor it conflicts
+    with, so conflicting processors still run in priority order.
+    """
+    stages: List[List[Processor]] = []
+    for processor in processors:
+        stage = 0
+        for i in range(len(stages) - 1, -1, -1):
+            if any(conflicts(other, processor) for other in stages[i]):
+                stage = i + 1
+                break
+        if stage == len(stages):
+            stages.append([])
+        stages[stage].append(processor)
+    return stages
+
+
+def explain(processors: List[Processor]) -> str:
+    """A report of the stages, and why each processor had to wait for the previous stage"""
+    stages = build_stages(processors)
+    lines: List[str] = []
+    for i, stage in enumerate(stages, 1):
+        lines.append(f"Stage {i}: {', '.join(type(p).__name__ for p in stage)}")
+        if i == 1:
+            continue
+        for processor in stage:
+            for other in stages[i - 2]:
+                for reason in conflicts(other, processor):
+                    lines.append(f"    {type(processor).__name__} after {type(other).__name__}: {reason}")
+    return "\n".join(lines)
@@ -0,0 +1,89 @@
+from array import array
+from collections import deque
+from typing import Deque, List
+
+from base import Entity, INDEX_BITS, INDEX_MASK
+
+"""
+Entity handles.
+
+An entity is `generation << 32 | index`.  The index is a slot that gets recycled once its entity is
+killed, so storage can keep everything in dense, slot-indexed lists; the generation is bumped every
+time the slot is freed, so a handle kept around after its entity died (in `Hauls.items`, say) no
+longer matches anything instead of silently pointing at whoever got the slot next.
+
+Slot 0 is never handed out, so the first entities of a world are still 1, 2, 3, ...
+"""
+
+MAX_GENERATION = (1 << 32) - 1
+
+
+def make_entity(index: int, generation: int) -> Entity:
+    return generation << INDEX_BITS | index
+
+
+def index_of(entity: Entity) -> int:
+    return entity & INDEX_MASK
+
+
+def generation_of(entity: Entity) -> int:
+    return entity >> INDEX_BITS
+
+
+class EntitySlots:
+    # Slot -> its current generation (the generation its next entity gets, while it's free)
+    generations: array
+    # Slot -> 1 if an entity lives in it
+    alive: bytearray
+    # Freed slots, oldest first -- reusing the oldest keeps stale handles from matching for longer
+    free: Deque[int]
+    count: int
+
+    def __init__(self) -> None:
+        self.generations = array("L", [0])
+        self.alive = bytearray(1)
+        self.free = deque()
+        self.count = 0
+
+    def __len__(self) -> int:
+        """The number of live entities"""
+        return self.count
+
+    def create(self) -> Entity:
+        if self.free:
+            index = self.free.popleft()
+        else:
+            index = len(self.generations)
+            self.generations.append(0)
+            self.alive.append(0)
+        self.alive[index] = 1
+        self.count += 1
+        return make_entity(index, self.generations[index])
+
+    def create_many(self, count: int) -> List[Entity]:
+        """`count` new entities -- recycled slots first, then fresh ones in one go"""
+        entities = [self.create() for _ in range(min(count, len(self.free)))]
+        fresh = count - len(entities)
+        if fresh > 0:
+            start = len(self.generations)
+            self.generations.extend([0] * fresh)
+            self.alive.extend(b"\x01" * fresh)
+            self.count += fresh
+            entities.extend(range(start, start + fresh))
+        return entities
+
+    def release(self, entity: Entity) -> None:
+        """Frees the entity's slot -- every handle to it is stale from now on"""
+        if not self.is_alive(entity):
+            return
+        index = entity & INDEX_MASK
+        self.alive[index] = 0
+        # Wraps around after 2^32 reuses of one slot
+        self.generations[index] = (self.generations[index] + 1) & MAX_GENERATION
+        self.free.append(index)
+        self.count -= 1
+
+    def is_alive(self, entity: Entity) -> bool:
+        index = entity & INDEX_MASK
+        return (entity >= 0 and index < len(self.alive) and self.alive[index] == 1
+                and self.generations[index] == entity >> INDEX_BITS)
@@ -0,0 +1,158 @@
+from typing import Dict, Iterable, Set, List, Optional, Tuple, Callable
+
+from base import Entity
+
+Coords = Tuple[int, int]
+
+
+class SpatialIndex:
+    """
+    Uniform cell grid over entity positions.
+
+    Entities are bucketed both by their exact tile (for `entities_at`) and by a coarser
+    `cell_size` x `cell_size` cell (for `within` / `nearest`), so spatial queries only
+    look at the neighbourhood they care about instead of every positioned entity.
+    All distances are Manhattan distances, matching `a_star.heuristic`.
+    """
+    cell_size: int
+    positions: Dict[Entity, Coords]
+    tiles: Dict[Coords, Set[Entity]]
+    cells: Dict[Coords, Set[Entity]]
+    # Bounding box of every cell that has ever been occupied -- limits `nearest`
+    bounds: Optional[Tuple[int, int, int, int]]
+
+    def __init__(self, cell_size: int = 8) -> None:
+        self.cell_size = cell_size
+        self.positions = {}
+        self.tiles = {}
+        self.cells = {}
+        self.bounds = None
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, entity: Entity) -> bool:
+        return entity in self.positions
+
+    def _cell(self, x: int, y: int) -> Coords:
+        return x // self.cell_size, y // self.cell_size
+
+    def insert(self, entity: Entity, x: int, y: int) -> None:
+        if entity in self.positions:
+            self.remove(entity)
+        self.positions[entity] = (x, y)
+        self.tiles.setdefault((x, y), set()).add(entity)
+        cell = self._cell(x, y)
+        self.cells.setdefault(cell, set()).add(entity)
+        if self.bounds is None:
+            self.bounds = (cell[0], cell[1], cell[0], cell[1])
+        else:
+            min_x, min_y, max_x, max_y = self.bounds
+            self.bounds = (min(min_x, cell[0]), min(min_y, cell[1]), max(max_x, cell[0]), max(max_y, cell[1]))
+
+    def insert_many(self, entities: Iterable[Entity], coords: Iterable[Coords]) -> None:
+        """`insert` for a batch of entities that aren't in the index yet"""
+        positions, tiles, cells, size = self.positions, self.tiles, self.cells, self.cell_size
+        touched: Set[Coords] = set()
+        for entity, (x, y) in zip(entities, coords):
+            positions[entity] = (x, y)
+            tile = tiles.get((x, y))
+            if tile is None:
+                tile = tiles[(x, y)] = set()
+            tile.add(entity)
+            cell = (x // size, y // size)
+            bucket = cells.get(cell)
+            if bucket is None:
+                bucket = cells[cell] = set()
+                touched.add(cell)
+            bucket.add(entity)
+        if touched:
+            min_x, min_y = min(cx for cx, _ in touched), min(cy for _, cy in touched)
+            max_x, max_y = max(cx for cx, _ in touched), max(cy for _, cy in touched)
+            if self.bounds is not None:
+                min_x, min_y = min(min_x, self.bounds[0]), min(min_y, self.bounds[1])
+                max_x, max_y = max(max_x, self.bounds[2]), max(max_y, self.bounds[3])
+            self.bounds = (min_x, min_y, max_x, max_y)
+
+    def remove(self, entity: Entity) -> None:
+        coords = self.positions.pop(entity, None)
+        if coords is None:
+            return
+        for buckets, key in ((self.tiles, coords), (self.cells, self._cell(*coords))):
+            bucket = buckets[key]
+            bucket.discard(entity)
+            # Remove the key to save space if its empty
+            if not bucket:
+                del buckets[key]
+
+    def move(self, entity: Entity, x: int, y: int) -> None:
+        coords = self.positions.get(entity)
+        if coords == (x, y):
+            return
+        size = self.cell_size
+        if coords is None or (coords[0] // size, coords[1] // size) != (x // size, y // size):
+            self.insert(entity, x, y)
+            return
+        # Still in the same cell -- only the tile buckets change
+        tile = self.tiles[coords]
+        tile.discard(entity)
+        if not tile:
+            del self.tiles[coords]
+        self.positions[entity] = (x, y)
+        tile = self.tiles.get((x, y))
+        if tile is None:
+            tile = self.tiles[(x, y)] = set()
+        tile.add(entity)
+
+    def entities_at(self, x: int, y: int) -> List[Entity]:
+        return list(self.tiles.get((x, y), ()))
+
+    def within(self, x: int, y: int, r: int) -> List[Entity]:
+        """Every entity within Manhattan distance `r` of (x, y)"""
+        min_cx, min_cy = self._cell(x - r, y - r)
+        max_cx, max_cy = self._cell(x + r, y + r)
+        found: List[Entity] = []
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                for entity in self.cells.get((cx, cy), ()):
+                    ex, ey = self.positions[entity]
+                    if abs(ex - x) + abs(ey - y) <= r:
+                        found.append(entity)
+        return found
+
+    def _ring(self, cx: int, cy: int, k: int):
+        """The cells at exactly Chebyshev distance `k` (in cells) from (cx, cy)"""
+        if k == 0:
+            yield cx, cy
+            return
+        for dx in range(-k, k + 1):
+            yield cx + dx, cy - k
+            yield cx + dx, cy + k
+        for dy in range(-k + 1, k):
+            yield cx - k, cy + dy
+            yield cx + k, cy + dy
+
+    def nearest(self, x: int, y: int, filter: Optional[Callable[[Entity], bool]] = None) -> Optional[Entity]:
+        """
+        The closest entity to (x, y) that passes `filter` (if given), or None.
+        Searches outward ring by ring, and stops as soon as no farther ring can hold anything closer.
+        """
+        if self.bounds is None:
+            return None
+        cx, cy = self._cell(x, y)
+        min_x, min_y, max_x, max_y = self.bounds
+        max_ring = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy)
+        closest: Tuple[Optional[Entity], int] = (None, -1)
+        for k in range(max_ring + 1):
+            for cell in self._ring(cx, cy, k):
+                for entity in self.cells.get(cell, ()):
+                    ex, ey = self.positions[entity]
+                    dist = abs(ex - x) + abs(ey - y)
+                    if closest[0] is not None and dist >= closest[1]:
+                        continue
+                    if filter is None or filter(entity):
+                        closest = (entity, dist)
+            # Anything in ring k + 1 is at least `k * cell_size + 1` away
+            if closest[0] is not None and closest[1] <= k * self.cell_size:
+                break
+        return closest[0]
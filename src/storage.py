@@ -0,0 +1,319 @@
+from typing import Dict, Set, List, Type, Optional, Tuple, Iterable, FrozenSet
+
+from base import C, Entity, INDEX_MASK
+from registry import type_mask
+
+"""
+Component storage backends for `World`.
+
+Both backends expose the same small interface so `World` can stay agnostic of how
+components are laid out in memory:
+    add / add_batch / remove / remove_entity / has / get / component_types / query_one / query
+
+`query` only runs when `World` registers a query;  from then on the query's own matches are kept
+up to date (see `query.Query`), so the layout matters for per-entity lookups and structural changes,
+not for iterating query results.
+"""
+
+class DictStorage:
+    """
+    The original layout:  every entity owns a dict of {component type: component},
+    and queries intersect the per-type entity sets.
+    Entities' dicts live in a dense list indexed by their slot (see `slots`).
+    """
+    components: Dict[Type[C], Set[Entity]]
+    # Slot -> the components of the entity in it, and which entity that is
+    slots: List[Optional[Dict[Type[C], C]]]
+    owners: List[Entity]
+
+    def __init__(self) -> None:
+        self.components = {}
+        self.slots = []
+        self.owners = []
+
+    def _components(self, entity: Entity) -> Optional[Dict[Type[C], C]]:
+        """The entity's components -- None if it has none, or the handle is stale"""
+        index = entity & INDEX_MASK
+        if index < len(self.owners) and self.owners[index] == entity:
+            return self.slots[index]
+        return None
+
+    def add(self, entity: Entity, component: C) -> None:
+        cls = component.__class__
+        comps = self._components(entity)
+        if comps is None:
+            index = entity & INDEX_MASK
+            if index >= len(self.owners):
+                self.slots.extend([None] * (index + 1 - len(self.owners)))
+                self.owners.extend([-1] * (index + 1 - len(self.owners)))
+            elif self.owners[index] != -1:
+                raise KeyError(f"Slot {index} still belongs to entity {self.owners[index]}, not {entity}")
+            comps = self.slots[index] = {}
+            self.owners[index] = entity
+        if cls not in self.components:
+            self.components[cls] = set()
+        self.components[cls].add(entity)
+        comps[cls] = component
+
+    def add_batch(self, entities: List[Entity], components: List[Dict[Type[C], C]]) -> None:
+        """Adds new entities that all have the same component types, e.g. a batch of one prefab"""
+        if not entities:
+            return
+        top = max(entity & INDEX_MASK for entity in entities)
+        if top >= len(self.owners):
+            self.slots.extend([None] * (top + 1 - len(self.owners)))
+            self.owners.extend([-1] * (top + 1 - len(self.owners)))
+        slots, owners = self.slots, self.owners
+        for entity, comps in zip(entities, components):
+            index = entity & INDEX_MASK
+            if owners[index] != -1:
+                raise KeyError(f"Slot {index} still belongs to entity {owners[index]}, not {entity}")
+            slots[index] = dict(comps)
+            owners[index] = entity
+        for cls in components[0]:
+            self.components.setdefault(cls, set()).update(entities)
+
+    def remove(self, entity: Entity, component: Type[C]) -> None:
+        self.components[component].discard(entity)
+        # Remove the component key to save space if its empty
+        if not self.components[component]:
+            del self.components[component]
+        del self.slots[entity & INDEX_MASK][component]
+
+    def remove_entity(self, entity: Entity) -> None:
+        for component in list(self.slots[entity & INDEX_MASK]):
+            self.remove(entity, component)
+        index = entity & INDEX_MASK
+        self.slots[index] = None
+        self.owners[index] = -1
+
+    def has_entity(self, entity: Entity) -> bool:
+        return self._components(entity) is not None
+
+    def has(self, entity: Entity, component: Type[C]) -> bool:
+        return entity in self.components.get(component, ())
+
+    def get(self, entity: Entity, component: Type[C]) -> Optional[C]:
+        comps = self._components(entity)
+        if comps is None:
+            return None
+        return comps.get(component)
+
+    def component_types(self, entity: Entity) -> Iterable[Type[C]]:
+        comps = self._components(entity)
+        return comps.keys() if comps is not None else ()
+
+    def query_one(self, component: Type[C]) -> Iterable[Tuple[Entity, C]]:
+        slots = self.slots
+        for entity in self.components.get(component, set()):
+            yield entity, slots[entity & INDEX_MASK][component]
+
+    def query(self, *components: Type[C]) -> Iterable[Tuple[Entity, List[C]]]:
+        try:
+            # Some set theory for speed
+            matches = set.intersection(*[self.components[c] for c in components])
+        except KeyError:
+            return
+        slots = self.slots
+        for entity in matches:
+            comps = slots[entity & INDEX_MASK]
+            yield entity, [comps[c] for c in components]
+
+
+class Archetype:
+    """
+    Every entity with exactly the component set `signature`.  Each component type is a
+    column (a list of the component objects), and an entity's components all live at the same
+    row of every column.  Processors mutate components in place, so there are no typed copies
+    of numeric fields to keep in sync.
+    """
+    signature: FrozenSet[Type[C]]
+    # The signature as a bitmask of component type IDs (see `registry`)
+    mask: int
+    entities: List[Entity]
+    columns: Dict[Type[C], List[C]]
+    # Cached transitions to the archetype reached by adding/removing one component type
+    add_edges: Dict[Type[C], "Archetype"]
+    remove_edges: Dict[Type[C], "Archetype"]
+
+    def __init__(self, signature: FrozenSet[Type[C]]) -> None:
+        self.signature = signature
+        self.mask = type_mask(signature)
+        self.entities = []
+        self.columns = {cls: [] for cls in signature}
+        self.add_edges = {}
+        self.remove_edges = {}
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def append(self, entity: Entity, components: Dict[Type[C], C]) -> int:
+        for cls, column in self.columns.items():
+            column.append(components[cls])
+        self.entities.append(entity)
+        return len(self.entities) - 1
+
+    def row(self, row: int) -> Dict[Type[C], C]:
+        return {cls: column[row] for cls, column in self.columns.items()}
+
+    def swap_remove(self, row: int) -> Optional[Entity]:
+        """
+        Removes `row` by moving the last row into its place.
+        Returns the entity that was moved (if any) so its location can be updated.
+        """
+        last = len(self.entities) - 1
+        for column in self.columns.values():
+            column[row] = column[last]
+            column.pop()
+        moved = self.entities[last]
+        self.entities[row] = moved
+        self.entities.pop()
+        return moved if row != last else None
+
+
+class ArchetypeStorage:
+    """
+    Columnar storage:  entities are grouped by archetype (their exact component set), and
+    registering a query walks whole matching archetypes rather than intersecting per-entity sets.
+    """
+    # Signature mask -> archetype
+    archetypes: Dict[int, Archetype]
+    # Slot -> (archetype, row) of the entity in it;  the archetype's `entities` tells which entity that is
+    locations: List[Optional[Tuple[Archetype, int]]]
+    # Matching archetypes per query (and the query's mask), kept up to date as new archetypes appear
+    query_cache: Dict[Tuple[Type[C], ...], List[Archetype]]
+    query_masks: Dict[Tuple[Type[C], ...], int]
+
+    def __init__(self) -> None:
+        self.empty = Archetype(frozenset())
+        self.archetypes = {self.empty.mask: self.empty}
+        self.locations = []
+        self.query_cache = {}
+        self.query_masks = {}
+
+    def _archetype(self, signature: FrozenSet[Type[C]]) -> Archetype:
+        mask = type_mask(signature)
+        try:
+            return self.archetypes[mask]
+        except KeyError:
+            archetype = self.archetypes[mask] = Archetype(signature)
+            for components, matches in self.query_cache.items():
+                wanted = self.query_masks[components]
+                if mask & wanted == wanted:
+                    matches.append(archetype)
+            return archetype
+
+    def _locate(self, entity: Entity) -> Optional[Tuple[Archetype, int]]:
+        """(archetype, row) of the entity -- None if it has no components, or the handle is stale"""
+        index = entity & INDEX_MASK
+        if index >= len(self.locations):
+            return None
+        location = self.locations[index]
+        if location is None or location[0].entities[location[1]] != entity:
+            return None
+        return location
+
+    def _place(self, entity: Entity, location: Tuple[Archetype, int]) -> None:
+        index = entity & INDEX_MASK
+        if index >= len(self.locations):
+            self.locations.extend([None] * (index + 1 - len(self.locations)))
+        self.locations[index] = location
+
+    def _move(self, entity: Entity, target: Archetype, components: Dict[Type[C], C]) -> None:
+        location = self._locate(entity)
+        if location is not None:
+            source, row = location
+            moved = source.swap_remove(row)
+            if moved is not None:
+                self._place(moved, (source, row))
+        else:
+            index = entity & INDEX_MASK
+            taken = self.locations[index] if index < len(self.locations) else None
+            if taken is not None:
+                raise KeyError(f"Slot {index} still belongs to entity {taken[0].entities[taken[1]]}, not {entity}")
+        self._place(entity, (target, target.append(entity, components)))
+
+    def add(self, entity: Entity, component: C) -> None:
+        cls = component.__class__
+        source, row = self._locate(entity) or (self.empty, None)
+        if cls in source.signature:
+            # Replacing a component doesn't change the archetype
+            source.columns[cls][row] = component
+            return
+        try:
+            target = source.add_edges[cls]
+        except KeyError:
+            target = source.add_edges[cls] = self._archetype(source.signature | {cls})
+        components = source.row(row) if row is not None else {}
+        components[cls] = component
+        self._move(entity, target, components)
+
+    def add_batch(self, entities: List[Entity], components: List[Dict[Type[C], C]]) -> None:
+        """Adds new entities that all have the same component types -- appended to their archetype in one go"""
+        if not entities:
+            return
+        for entity in entities:
+            index = entity & INDEX_MASK
+            taken = self.locations[index] if index < len(self.locations) else None
+            if taken is not None:
+                raise KeyError(f"Slot {index} still belongs to entity {taken[0].entities[taken[1]]}, not {entity}")
+        target = self._archetype(frozenset(components[0]))
+        start = len(target)
+        for cls, column in target.columns.items():
+            column.extend(comps[cls] for comps in components)
+        target.entities.extend(entities)
+        for row, entity in enumerate(entities, start):
+            self._place(entity, (target, row))
+
+    def remove(self, entity: Entity, component: Type[C]) -> None:
+        source, row = self._locate(entity)
+        try:
+            target = source.remove_edges[component]
+        except KeyError:
+            target = source.remove_edges[component] = self._archetype(source.signature - {component})
+        components = source.row(row)
+        del components[component]
+        self._move(entity, target, components)
+
+    def remove_entity(self, entity: Entity) -> None:
+        source, row = self._locate(entity)
+        self.locations[entity & INDEX_MASK] = None
+        moved = source.swap_remove(row)
+        if moved is not None:
+            self._place(moved, (source, row))
+
+    def has_entity(self, entity: Entity) -> bool:
+        return self._locate(entity) is not None
+
+    def has(self, entity: Entity, component: Type[C]) -> bool:
+        location = self._locate(entity)
+        return location is not None and component in location[0].signature
+
+    def get(self, entity: Entity, component: Type[C]) -> Optional[C]:
+        location = self._locate(entity)
+        if location is None:
+            return None
+        column = location[0].columns.get(component)
+        return column[location[1]] if column is not None else None
+
+    def component_types(self, entity: Entity) -> Iterable[Type[C]]:
+        location = self._locate(entity)
+        return location[0].signature if location is not None else ()
+
+    def matching(self, *components: Type[C]) -> List[Archetype]:
+        try:
+            return self.query_cache[components]
+        except KeyError:
+            wanted = self.query_masks[components] = type_mask(components)
+            matches = [a for mask, a in self.archetypes.items() if mask & wanted == wanted]
+            return self.query_cache.setdefault(components, matches)
+
+    def query_one(self, component: Type[C]) -> Iterable[Tuple[Entity, C]]:
+        for archetype in self.matching(component):
+            yield from zip(archetype.entities, archetype.columns[component])
+
+    def query(self, *components: Type[C]) -> Iterable[Tuple[Entity, List[C]]]:
+        for archetype in self.matching(*components):
+            columns = [archetype.columns[c] for c in components]
+            for row, entity in enumerate(archetype.entities):
+                yield entity, [column[row] for column in columns]
@@ -1,6 +1,122 @@
-from dataclasses import dataclass as component
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from a_star import NavGrid
+from registry import component
+
+"""
+Terrain, stored as a dense layer instead of one entity per tile.
+
+The map is split into `chunk_size` x `chunk_size` chunks, each holding flat arrays of the tile
+modifiers and tile types.  Chunks are only allocated once something is written to them -- reading
+an untouched chunk gives the defaults (plain ground, modifier 0) -- so a huge, mostly plain map
+costs next to nothing.
+
+A tile's modifier is its extra movement cost:  stepping onto it costs `1 + modifier` (never less
+than 1), and the layer keeps the nav grid's step costs in sync so every pathfinder sees it.
+"""
+
+Coords = Tuple[int, int]
+DEFAULT_CHUNK_SIZE = 64
+# Step costs are stored in a bytearray on the nav grid
+MAX_STEP_COST = 255
 
 
 @component
 class Terrain:
     modifier: int = 0
+
+
+class Chunk:
+    modifiers: array
+    # Tile type id per tile (0 = plain ground)
+    tiles: bytearray
+
+    def __init__(self, size: int) -> None:
+        self.modifiers = array("h", [0]) * (size * size)
+        self.tiles = bytearray(size * size)
+
+
+class TerrainLayer:
+    rows: int
+    cols: int
+    chunk_size: int
+    chunks: Dict[Coords, Chunk]
+    nav: Optional[NavGrid]
+
+    def __init__(self, rows: int, cols: int, nav: Optional[NavGrid] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        self.rows = rows
+        self.cols = cols
+        self.chunk_size = chunk_size
+        self.chunks = {}
+        self.nav = nav
+
+    def _locate(self, x: int, y: int) -> Tuple[Coords, int]:
+        """(chunk, index within the chunk) of a tile"""
+        if not (0 <= x < self.rows and 0 <= y < self.cols):
+            raise IndexError(f"({x}, {y}) is off the map")
+        size = self.chunk_size
+        return (x // size, y // size), (x % size) * size + y % size
+
+    def _chunk(self, key: Coords) -> Chunk:
+        try:
+            return self.chunks[key]
+        except KeyError:
+            return self.chunks.setdefault(key, Chunk(self.chunk_size))
+
+    # ---- Reading Functions ---- #
+    def modifier(self, x: int, y: int) -> int:
+        key, idx = self._locate(x, y)
+        chunk = self.chunks.get(key)
+        return chunk.modifiers[idx] if chunk is not None else 0
+
+    def tile(self, x: int, y: int) -> int:
+        key, idx = self._locate(x, y)
+        chunk = self.chunks.get(key)
+        return chunk.tiles[idx] if chunk is not None else 0
+
+    def get(self, x: int, y: int) -> Terrain:
+        """The tile's terrain as a (detached) `Terrain` component"""
+        return Terrain(modifier=self.modifier(x, y))
+
+    def modifiers(self, x0: int, y0: int, x1: int, y1: int) -> List[List[int]]:
+        """The modifiers of every tile from (x0, y0) to (x1, y1) inclusive, row by row"""
+        return [[self.modifier(x, y) for y in range(y0, y1 + 1)] for x in range(x0, x1 + 1)]
+
+    # ---- Writing Functions ---- #
+    def set(self, x: int, y: int, modifier: Optional[int] = None, tile: Optional[int] = None) -> None:
+        key, idx = self._locate(x, y)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            # Writing the defaults into an untouched chunk changes nothing -- don't allocate it
+            if not modifier and not tile:
+                return
+            chunk = self._chunk(key)
+        if tile is not None:
+            chunk.tiles[idx] = tile
+        if modifier is not None and chunk.modifiers[idx] != modifier:
+            chunk.modifiers[idx] = modifier
+            if self.nav is not None:
+                self.nav.set_cost(x, y, step_cost(modifier))
+
+    def clear(self) -> None:
+        """Back to plain ground everywhere, with no chunks allocated"""
+        size = self.chunk_size
+        for (cx, cy), chunk in self.chunks.items():
+            for idx, modifier in enumerate(chunk.modifiers):
+                if modifier and self.nav is not None:
+                    x, y = cx * size + idx // size, cy * size + idx % size
+                    self.nav.set_cost(x, y, 1)
+        self.chunks.clear()
+
+    def fill(self, x0: int, y0: int, x1: int, y1: int, modifier: Optional[int] = None,
+             tile: Optional[int] = None) -> None:
+        """Writes every tile from (x0, y0) to (x1, y1) inclusive (clipped to the map)"""
+        for x in range(max(0, x0), min(self.rows - 1, x1) + 1):
+            for y in range(max(0, y0), min(self.cols - 1, y1) + 1):
+                self.set(x, y, modifier, tile)
+
+
+def step_cost(modifier: int) -> int:
+    return min(MAX_STEP_COST, max(1, 1 + modifier))
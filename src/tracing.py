@@ -0,0 +1,181 @@
+import argparse
+import pickle
+import struct
+import threading
+from collections import deque
+from enum import IntEnum
+from typing import Any, BinaryIO, Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from base import Entity
+
+"""
+Structured debug/trace channel.
+
+Processors log raw events -- a message template and its arguments -- instead of building strings:
+
+    debug = self.world.trace.channel(Level.DEBUG)
+    ...
+    if debug:
+        debug(entity, "{} moving to {}", name.name, next_step)
+
+While tracing is off (the default), or the level is filtered out, `channel` returns None and the
+call site costs one truthiness check.  Events are kept in a bounded ring buffer per entity and only
+formatted when read (`messages`), and can also be streamed to a binary trace file for `read_trace`
+(or `python tracing.py dump FILE`) afterwards.  Arguments are stored as they are, so pass values
+(tuples, numbers, strings) rather than components that will keep changing.
+"""
+
+# Events about the world as a whole -- slot 0 is never handed out to an entity
+WORLD: Entity = 0
+
+
+class Level(IntEnum):
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+
+
+# tick, level, entity, template, args
+Event = Tuple[int, Level, Entity, str, Tuple[Any, ...]]
+
+# Trace file records:  a template the first time it's used, then events referring to it by ID
+_TEMPLATE = struct.Struct("<cHI")
+_EVENT = struct.Struct("<cIBQHI")
+
+
+def format_event(event: Event) -> str:
+    return event[3].format(*event[4])
+
+
+class Trace:
+    enabled: bool
+    level: Level
+    # Only these entities' events are kept (None for everyone's)
+    entities: Optional[Set[Entity]]
+    # Events kept per entity -- older ones are dropped
+    capacity: int
+    buffers: Dict[Entity, Deque[Event]]
+    tick: int
+    file: Optional[BinaryIO]
+    # Template -> its ID in the trace file
+    templates: Dict[str, int]
+    _lock: threading.Lock
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.level = Level.DEBUG
+        self.entities = None
+        self.capacity = 64
+        self.buffers = {}
+        self.tick = 0
+        self.file = None
+        self.templates = {}
+        self._lock = threading.Lock()
+
+    def enable(self, level: Level = Level.DEBUG, entities: Optional[Set[Entity]] = None, capacity: int = 64,
+               path: Optional[str] = None) -> None:
+        """Starts keeping events at `level` and up (of `entities` only, if given), and writing them to `path`"""
+        self.close()
+        self.enabled = True
+        self.level = level
+        self.entities = set(entities) if entities is not None else None
+        if capacity != self.capacity:
+            self.buffers = {entity: deque(events, capacity) for entity, events in self.buffers.items()}
+        self.capacity = capacity
+        if path is not None:
+            self.file = open(path, "wb")
+
+    def disable(self) -> None:
+        self.enabled = False
+        self.close()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.templates = {}
+
+    def channel(self, level: Level) -> Optional[Callable[..., None]]:
+        """A logging function for `level` -- None while tracing is off or the level is filtered out"""
+        if not self.enabled or level < self.level:
+            return None
+        return lambda entity, template, *args: self.log(level, entity, template, *args)
+
+    def log(self, level: Level, entity: Entity, template: str, *args: Any) -> None:
+        if not self.enabled or level < self.level:
+            return
+        if self.entities is not None and entity not in self.entities:
+            return
+        event = (self.tick, level, entity, template, args)
+        buffer = self.buffers.get(entity)
+        if buffer is None:
+            buffer = self.buffers.setdefault(entity, deque(maxlen=self.capacity))
+        buffer.append(event)
+        if self.file is not None:
+            self._write(event)
+
+    def _write(self, event: Event) -> None:
+        tick, level, entity, template, args = event
+        with self._lock:
+            template_id = self.templates.get(template)
+            if template_id is None:
+                template_id = self.templates[template] = len(self.templates)
+                encoded = template.encode()
+                self.file.write(_TEMPLATE.pack(b"T", template_id, len(encoded)) + encoded)
+            payload = pickle.dumps(args, pickle.HIGHEST_PROTOCOL)
+            self.file.write(_EVENT.pack(b"E", tick, level, entity, template_id, len(payload)) + payload)
+
+    def advance(self) -> None:
+        self.tick += 1
+
+    # ---- Reading Functions ---- #
+    def events(self, entity: Entity) -> List[Event]:
+        return list(self.buffers.get(entity, ()))
+
+    def messages(self, entity: Entity) -> List[str]:
+        """The entity's kept events, formatted"""
+        return [format_event(event) for event in self.buffers.get(entity, ())]
+
+    def clear(self, entity: Optional[Entity] = None) -> None:
+        if entity is None:
+            self.buffers.clear()
+        else:
+            self.buffers.pop(entity, None)
+
+
+def read_trace(path: str) -> Iterator[Event]:
+    """Every event in a trace file, in the order they were logged"""
+    templates: Dict[int, str] = {}
+    with open(path, "rb") as file:
+        while True:
+            kind = file.read(1)
+            if not kind:
+                return
+            if kind == b"T":
+                template_id, size = struct.unpack("<HI", file.read(_TEMPLATE.size - 1))
+                templates[template_id] = file.read(size).decode()
+            elif kind == b"E":
+                tick, level, entity, template_id, size = struct.unpack("<IBQHI", file.read(_EVENT.size - 1))
+                yield tick, Level(level), entity, templates[template_id], pickle.loads(file.read(size))
+            else:
+                raise ValueError(f"{path} is not a trace file (record type {kind!r})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Work with trace files written by `Trace.enable(path=...)`")
+    commands = parser.add_subparsers(dest="command", required=True)
+    dump = commands.add_parser("dump", help="Print a trace file's events")
+    dump.add_argument("path")
+    dump.add_argument("--entity", type=int, action="append", help="Only this entity's events (repeatable)")
+    dump.add_argument("--level", choices=[level.name for level in Level], default=Level.DEBUG.name)
+    args = parser.parse_args()
+    level = Level[args.level]
+    for event in read_trace(args.path):
+        tick, event_level, entity, _, _ = event
+        if event_level < level or (args.entity and entity not in args.entity):
+            continue
+        print(f"{tick:>6} {event_level.name:<8}{entity:>12}  {format_event(event)}")
+
+
+if __name__ == "__main__":
+    main()
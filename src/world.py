@@ -1,147 +1,459 @@
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from random import randint
-from typing import Dict, Set, List, Type, Optional, Tuple, Iterable
+from typing import Callable, Collection, Dict, FrozenSet, Iterable, Set, List, Type, Optional, Tuple, Union
 
-from a_star import Graph
+from a_star import NavGrid
+from activity import ActivityMap
 from base import C, Entity, Processor, MAP_WIDTH, MAP_HEIGHT
+from changes import Changes
+from dispatch import TaskDispatcher
 from components import Position, Obstacle
-from terrain import Terrain
+from flow_field import FlowFields
+from prefab import Prefab, get_prefab
+from profiler import Profiler
+from query import Query
+from regions import RegionIndex
+from scheduler import build_stages, explain
+from slots import EntitySlots
+from spatial import SpatialIndex
+from storage import DictStorage, ArchetypeStorage
+from terrain import TerrainLayer
+from tracing import Trace
 
 
 class World:
-    components: Dict[Type[C], Set[Entity]] = dict()
-    processors: List[Processor] = []
-    entities: Dict[Entity, Set[Type[C]]] = dict()
-    terrain: Set[Entity] = set()
-    next_entity_id: int = 0
-    dead_entities: Set[Entity] = set()
-    # - Caches - #
-    component_cache: Dict[Type[C], List[Tuple[Entity, C]]] = dict()
-    multi_component_cache: Dict[List[Type[C]], List[Tuple[Entity, List[C]]]] = dict()
+    # Component storage backend -- `DictStorage` (default) or `ArchetypeStorage`
+    storage: Union[DictStorage, ArchetypeStorage]
+    processors: List[Processor]
+    # Processors grouped into stages that can run side by side (see `scheduler`)
+    _stages: Optional[List[List[Processor]]]
+    # Runs each stage on this many threads -- None runs every processor one after the other
+    workers: Optional[int]
+    _executor: Optional[ThreadPoolExecutor]
+    # Guards structural changes (adding/removing/moving components) while a stage runs in parallel
+    lock: threading.RLock
+    # What query reads hold -- `lock` when stages run in parallel, otherwise nothing (reads can't
+    # race a structural change when only one processor runs at a time)
+    _read_lock: Union[threading.RLock, nullcontext]
+    # Dense, chunked terrain -- its step costs are mirrored onto `nav`
+    terrain: TerrainLayer
+    # Entity handles -- slots are recycled, and each reuse bumps the slot's generation
+    entities: EntitySlots
+    dead_entities: Set[Entity]
+    # - Queries - #
+    queries: Dict[Tuple[Type[C], ...], Query]
+    # Component type -> every registered query that includes it
+    component_queries: Dict[Type[C], List[Query]]
+    # Component type -> every change subscription that includes it
+    change_trackers: Dict[Type[C], List[Changes]]
     # - Game Board - #
-    rows: int = MAP_HEIGHT
-    cols: int = MAP_WIDTH
+    spatial: SpatialIndex
+    # Which chunks (spatial index cells) are awake -- None if chunks never sleep
+    activity: Optional[ActivityMap]
+    # Long-lived navigation grid, kept in sync with every impassable `Obstacle` that has a `Position`
+    nav: NavGrid
+    # Distance fields shared by every entity heading to the same place
+    flow_fields: FlowFields
+    # Tile -> region and item -> region lookups for stockpiles
+    regions: RegionIndex
+    # Decides which task each `Tasked` entity works on
+    tasks: TaskDispatcher
+    rows: int
+    cols: int
+    # Per-processor instrumentation -- None (the default) while profiling is off
+    profiler: Optional[Profiler]
+    # Structured debug events -- off until `trace.enable()`
+    trace: Trace
+
+    def __init__(
+            self,
+            storage: Optional[Union[DictStorage, ArchetypeStorage]] = None,
+            rows: int = MAP_HEIGHT,
+            cols: int = MAP_WIDTH,
+            workers: Optional[int] = None,
+            sleeping: bool = True,
+    ) -> None:
+        self.rows = rows
+        self.cols = cols
+        self.storage = storage if storage is not None else DictStorage()
+        self.processors = []
+        self._stages = None
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers) if workers else None
+        self.lock = threading.RLock()
+        self._read_lock = self.lock if workers else nullcontext()
+        self.entities = EntitySlots()
+        self.dead_entities = set()
+        self.spatial = SpatialIndex()
+        self.activity = ActivityMap(self.spatial.cell_size) if sleeping else None
+        self.nav = NavGrid(rows, cols)
+        self.terrain = TerrainLayer(rows, cols, self.nav)
+        self.flow_fields = FlowFields(self.nav)
+        self.profiler = None
+        self.trace = Trace()
+        self.queries = {}
+        self.component_queries = {}
+        self.change_trackers = {}
+        self.regions = RegionIndex(self)
+        self.tasks = TaskDispatcher(self)
 
     # ---- Cleanup Functions ---- #
     def clear_caches(self):
-        self.component_cache = {}
-        self.multi_component_cache = {}
+        """Drops every registered query; they are rebuilt from storage the next time they're used"""
+        self.queries = {}
+        self.component_queries = {}
+        if self.profiler is not None:
+            self.profiler.invalidated()
 
     # ---- Initialization Functions ---- #
     def init_board(self) -> None:
-        for r in range(self.rows):
-            for c in range(self.cols):
-                self.terrain.add(self.add_entity([Terrain(), Position(x=r, y=c)]))
+        """Resets the map to plain ground -- chunks are only allocated again once terrain is written"""
+        self.terrain.clear()
 
-    def random_coords(self, skip: List[Tuple[int, int]]) -> Tuple[int, int]:
+    def random_coords(self, skip: Collection[Tuple[int, int]]) -> Tuple[int, int]:
         coords = (randint(0, self.rows - 1), randint(0, self.cols - 1))
         while coords in skip:
             coords = (randint(0, self.rows - 1), randint(0, self.cols - 1))
         return coords
 
-    def get_obstacles(self) -> List[Tuple[int, int]]:
-        obstacles: List[Tuple[int, int]] = []
-        for _, (position, obstacle) in self.get_components(Position, Obstacle):
-            if not obstacle.is_passable:
-                obstacles.append((position.x, position.y))
-        return obstacles
+    def get_obstacles(self) -> Set[Tuple[int, int]]:
+        return self.nav.blocked_cells()
+
+    def is_obstacle(self, x: int, y: int) -> bool:
+        return self.nav.is_blocked(x, y)
+
+    def set_passable(self, entity: Entity, passable: bool) -> None:
+        """Flips an `Obstacle` in place, keeping the nav grid in sync"""
+        with self.lock:
+            blocking = self._blocking_at(entity)
+            self.storage.get(entity, Obstacle).is_passable = passable
+            self._update_nav(entity, blocking)
+            self.mark_changed(entity, Obstacle)
+
+    def _blocking_at(self, entity: Entity) -> Optional[Tuple[int, int]]:
+        """The tile the entity currently blocks on the nav grid, if any"""
+        obstacle = self.storage.get(entity, Obstacle)
+        if obstacle is None or obstacle.is_passable:
+            return None
+        return self.spatial.positions.get(entity)
+
+    def _update_nav(self, entity: Entity, blocked: Optional[Tuple[int, int]]) -> None:
+        """Moves the entity's mark on the nav grid from the tile it `blocked` to wherever it blocks now"""
+        blocking = self._blocking_at(entity)
+        if blocking != blocked:
+            if blocked:
+                self.nav.unblock(*blocked)
+                self.wake_at(*blocked, neighbours=True)
+            if blocking:
+                self.nav.block(*blocking)
+                self.wake_at(*blocking, neighbours=True)
+
+    # ---- Spatial Functions ---- #
+    def entities_at(self, x: int, y: int) -> List[Entity]:
+        return self.spatial.entities_at(x, y)
+
+    def within(self, x: int, y: int, r: int) -> List[Entity]:
+        return self.spatial.within(x, y, r)
+
+    def nearest(self, x: int, y: int, filter: Optional[Callable[[Entity], bool]] = None) -> Optional[Entity]:
+        return self.spatial.nearest(x, y, filter)
 
-    def build_graph(self) -> Graph:
-        return Graph(self.rows, self.cols)
+    def move_entity(self, entity: Entity, x: int, y: int) -> None:
+        """Moves an entity's `Position` in place, keeping the spatial index in sync"""
+        with self.lock:
+            self._move(entity, x, y)
+
+    def move_entities(self, moves: Iterable[Tuple[Entity, int, int]]) -> None:
+        """`move_entity` for a batch of (entity, x, y) moves, applied in order"""
+        with self.lock:
+            for entity, x, y in moves:
+                self._move(entity, x, y)
+
+    def _move(self, entity: Entity, x: int, y: int) -> None:
+        obstacle = self.storage.get(entity, Obstacle)
+        # Only impassable obstacles have a mark on the nav grid to move along
+        blocks = obstacle is not None and not obstacle.is_passable
+        blocking = self.spatial.positions.get(entity) if blocks else None
+        position = self.storage.get(entity, Position)
+        self.wake(entity)
+        position.x, position.y = x, y
+        self.spatial.move(entity, x, y)
+        if blocks:
+            self._update_nav(entity, blocking)
+        self.mark_changed(entity, Position)
+
+    # ---- Activity Functions ---- #
+    def wake(self, entity: Entity, neighbours: bool = False) -> None:
+        """Keeps the chunk the entity stands in awake for a while (no-op for unpositioned entities)"""
+        if self.activity is not None:
+            coords = self.spatial.positions.get(entity)
+            if coords is not None:
+                self.activity.wake(*coords, neighbours)
+
+    def wake_at(self, x: int, y: int, neighbours: bool = False) -> None:
+        if self.activity is not None:
+            self.activity.wake(x, y, neighbours)
+
+    def get_active_components(self, *components: Type[C]) -> List[Tuple[Entity, List[C]]]:
+        """
+        Like `get_components`, but only the positioned entities in awake chunks, in entity order.
+        Costs O(entities in awake chunks) instead of O(matches).  Without sleeping, it's `get_components`.
+        """
+        if self.activity is None:
+            return self.get_components(*components)
+        with self._read_lock:
+            matches = self.get_query(*components).matches
+            cells = self.spatial.cells
+            found = []
+            for chunk in self.activity.active():
+                for entity in cells.get(chunk, ()):
+                    comps = matches.get(entity)
+                    if comps is not None:
+                        found.append((entity, comps))
+        found.sort(key=lambda match: match[0])
+        if self.profiler is not None:
+            # Rebuilt from the awake chunks on every call, so it's never a reused snapshot
+            self.profiler.query(False, False, len(found))
+        return found
 
     # ---- Processing Functions ---- #
     def process(self) -> None:
         self.kill_entities()
-        for processor in self.processors:
-            processor.process()
+        # Profiling wraps each processor, so the world itself stays a plain loop while it's off
+        run = self.profiler.run if self.profiler is not None else lambda p: p.process()
+        if not self._executor:
+            for processor in self.processors:
+                run(processor)
+        else:
+            if self._stages is None:
+                self._stages = build_stages(self.processors)
+            for stage in self._stages:
+                if len(stage) == 1:
+                    run(stage[0])
+                else:
+                    # `list` waits for the whole stage (and re-raises anything a processor raised)
+                    list(self._executor.map(run, stage))
+        if self.profiler is not None:
+            self.profiler.end_tick()
+        if self.activity is not None:
+            self.activity.advance()
+        self.trace.advance()
+
+    def enable_profiling(self, window: int = 120, report_every: Optional[int] = None) -> Profiler:
+        """
+        Starts recording per-processor stats over the last `window` ticks, printing a summary every
+        `report_every` ticks if given.  Returns the profiler, for `summary()`/`format()`.
+        """
+        self.profiler = Profiler(window, report_every)
+        return self.profiler
+
+    def disable_profiling(self) -> None:
+        self.profiler = None
+
+    def explain_schedule(self) -> str:
+        """Which processors run side by side, and why the others were serialized"""
+        return explain(self.processors)
 
     # ---- Entity Functions ---- #
     def add_entity(self, components: List[C]) -> Entity:
-        self.next_entity_id += 1
+        entity = self.entities.create()
         for comp in components:
-            self.add_component(self.next_entity_id, comp)
-        return self.next_entity_id
+            self.add_component(entity, comp)
+        return entity
+
+    def add_entities(self, batch: Union[str, Prefab, Iterable[List[C]]], count: Optional[int] = None,
+                     **columns: Iterable) -> List[Entity]:
+        """
+        Spawns many entities at once -- either from a prefab (or its name) and column-style data, e.g.
+        `add_entities(SOCK, Position=coords, Name=names)`, or from a list of component lists.
+        Storage, queries, change trackers and the nav grid are updated once per component layout
+        instead of once per component;  the entities of each layout reach queries in spawn order.
+        """
+        if isinstance(batch, str):
+            batch = get_prefab(batch)
+        if isinstance(batch, Prefab):
+            batch = batch.build(count, **columns)
+        # Component layout -> (its entities, their components)
+        layouts: Dict[FrozenSet[Type[C]], Tuple[List[Entity], List[Dict[Type[C], C]]]] = {}
+        batch = list(batch)
+        with self.lock:
+            entities = self.entities.create_many(len(batch))
+            for entity, components in zip(entities, batch):
+                comps = {comp.__class__: comp for comp in components}
+                members, rows = layouts.setdefault(frozenset(comps), ([], []))
+                members.append(entity)
+                rows.append(comps)
+            for layout, (members, rows) in layouts.items():
+                self._spawn(layout, members, rows)
+        return entities
+
+    def _spawn(self, layout: FrozenSet[Type[C]], entities: List[Entity], rows: List[Dict[Type[C], C]]) -> None:
+        """Indexes a batch of new entities that all have the components in `layout`"""
+        self.storage.add_batch(entities, rows)
+        if Position in layout:
+            coords = [(comps[Position].x, comps[Position].y) for comps in rows]
+            self.spatial.insert_many(entities, coords)
+            if self.activity is not None:
+                for chunk in {self.activity.chunk_of(x, y) for x, y in coords}:
+                    self.activity.wake(chunk[0] * self.activity.chunk_size, chunk[1] * self.activity.chunk_size)
+            if Obstacle in layout:
+                for entity in entities:
+                    self._update_nav(entity, None)
+        # Every query this layout satisfies, once each
+        queries = {id(query): query
+                   for component in layout for query in self.component_queries.get(component, ())
+                   if layout.issuperset(query.components)}
+        for query in queries.values():
+            query.update((entity, [comps[c] for c in query.components]) for entity, comps in zip(entities, rows))
+        for component in layout:
+            for changes in self.change_trackers.get(component, ()):
+                changes.added.update(entities)
 
     def remove_entity(self, entity: Entity) -> None:
         self.dead_entities.add(entity)
 
     def kill_entities(self) -> None:
-        self.clear_caches()
-        for entity in self.dead_entities:
-            # Delete the entity from all component references
-            for component_name in self.entities[entity]:
-                self.remove_component(entity, component_name)
-            del self.entities[entity]
-        self.dead_entities.clear()
+        with self.lock:
+            for entity in self.dead_entities:
+                if not self.entities.is_alive(entity):
+                    # Killed twice, or a stale handle
+                    continue
+                # Delete the entity from all component references
+                if self.storage.has_entity(entity):
+                    self.wake(entity, neighbours=True)
+                    blocking = self._blocking_at(entity)
+                    if blocking:
+                        self.nav.unblock(*blocking)
+                    for component in self.storage.component_types(entity):
+                        for query in self.component_queries.get(component, ()):
+                            query.discard(entity)
+                        for changes in self.change_trackers.get(component, ()):
+                            changes.removed.add(entity)
+                    self.storage.remove_entity(entity)
+                    self.spatial.remove(entity)
+                self.entities.release(entity)
+            self.dead_entities.clear()
 
     def entity_exists(self, entity: Entity) -> bool:
-        return entity in self.entities and entity not in self.dead_entities
+        """False for entities that were killed (or are about to be) -- even if their slot was reused since"""
+        return self.entities.is_alive(entity) and entity not in self.dead_entities
 
     # ---- Component Functions ---- #
     def add_component(self, entity: Entity, component: C) -> None:
-        cls = component.__class__
-        if cls not in self.components:
-            self.components[cls] = set()
-        self.components[cls].add(entity)
-        if entity not in self.entities:
-            self.entities[entity] = {}
-        self.entities[entity][cls] = component
+        if not self.entities.is_alive(entity):
+            raise KeyError(f"Entity {entity} doesn't exist (anymore)")
+        with self.lock:
+            self.wake(entity)
+            blocking = self._blocking_at(entity)
+            trackers = self.change_trackers.get(component.__class__)
+            if trackers:
+                replaced = self.storage.has(entity, component.__class__)
+                for changes in trackers:
+                    (changes.modified if replaced else changes.added).add(entity)
+            self.storage.add(entity, component)
+            if component.__class__ is Position:
+                self.spatial.move(entity, component.x, component.y)
+            if component.__class__ is Position or component.__class__ is Obstacle:
+                self._update_nav(entity, blocking)
+            if component.__class__ is Position:
+                self.wake(entity)
+            # Only the queries that include this component type can be affected
+            for query in self.component_queries.get(component.__class__, ()):
+                comps = [self.storage.get(entity, c) for c in query.components]
+                if None not in comps:
+                    query.set(entity, comps)
 
     def remove_component(self, entity: Entity, component: Type[C]) -> None:
-        self.components[component].discard(entity)
-        # Remove the component key to save space if its empty
-        if not self.components[component]:
-            del self.components[component]
-        del self.entities[entity][component]
-        self.clear_caches()
+        with self.lock:
+            self.wake(entity)
+            blocking = self._blocking_at(entity)
+            self.storage.remove(entity, component)
+            if component is Position:
+                self.spatial.remove(entity)
+            if component is Position or component is Obstacle:
+                self._update_nav(entity, blocking)
+            for query in self.component_queries.get(component, ()):
+                query.discard(entity)
+            for changes in self.change_trackers.get(component, ()):
+                changes.removed.add(entity)
 
-    def has_component(self, entity: Entity, component: Type[C]) -> bool:
-        return entity in self.components[component]
+    def mark_changed(self, entity: Entity, component: Type[C]) -> None:
+        """Flags a component that was mutated in place (e.g. `position.x = ...`) as modified"""
+        self.wake(entity)
+        for changes in self.change_trackers.get(component, ()):
+            changes.modified.add(entity)
 
-    def _get_component(self, component: Type[C]) -> Iterable[Tuple[Entity, C]]:
-        for entity in self.components.get(component, set()):
-            yield entity, self.entities[entity][component]
+    def track_changes(self, *components: Type[C]) -> Changes:
+        """
+        Subscribes to changes of the given component types.  Every subscriber gets its own `Changes`,
+        which it clears once it has handled them (usually at the end of its `process`).
+        """
+        changes = Changes(components)
+        with self.lock:
+            for component in set(components):
+                self.change_trackers.setdefault(component, []).append(changes)
+        return changes
 
-    def get_component(self, component: Type[C]) -> List[Tuple[Entity, C]]:
-        try:
-            return self.component_cache[component]
-        except KeyError:
-            # Not in cache yet, add it and return
-            result = list(self._get_component(component))
-            return self.component_cache.setdefault(component, result)
+    def has_component(self, entity: Entity, component: Type[C]) -> bool:
+        return self.storage.has(entity, component)
 
-    def _get_components(self, *components: Type[C]) -> List[Tuple[Entity, List[C]]]:
-        try:
-            # Some set theory for speed
-            for entity in set.intersection(*[self.components[c] for c in components]):
-                yield entity, [self.entities[entity][c] for c in components]
-        except TypeError:
+    def _register_query(self, *components: Type[C]) -> Query:
+        if not components:
             print("No components passed to world.get_components()")
             sys.exit(1)
-        except KeyError:
-            pass
+        query = self.queries[components] = Query(components)
+        for entity, comps in self.storage.query(*components):
+            query.matches[entity] = comps
+        for component in set(components):
+            self.component_queries.setdefault(component, []).append(query)
+        return query
 
-    def get_components(self, *components: Type[C]) -> List[Tuple[Entity, List[C]]]:
+    def get_query(self, *components: Type[C]) -> Query:
         try:
-            return self.multi_component_cache[components]
+            return self.queries[components]
         except KeyError:
-            # Not in cache yet, add it and return
-            result = list(self._get_components(*components))
-            return self.multi_component_cache.setdefault(components, result)
+            # Not registered yet -- from now on it's kept up to date by add/remove_component
+            with self.lock:
+                return self.queries.get(components) or self._register_query(*components)
+
+    def get_component(self, component: Type[C]) -> List[Tuple[Entity, C]]:
+        with self._read_lock:
+            if self.profiler is not None:
+                return self._profiled_query((component,), single=True)
+            return self.get_query(component).single_result()
+
+    def get_components(self, *components: Type[C]) -> List[Tuple[Entity, List[C]]]:
+        with self._read_lock:
+            if self.profiler is not None:
+                return self._profiled_query(components, single=False)
+            return self.get_query(*components).result()
+
+    def _profiled_query(self, components: Tuple[Type[C], ...], single: bool) -> List[Tuple[Entity, C]]:
+        query = self.queries.get(components)
+        hit = query is not None and query.fresh(single)
+        if query is None:
+            query = self.get_query(*components)
+        result = query.single_result() if single else query.result()
+        self.profiler.query(single, hit, len(result))
+        return result
 
     def get_entity_component(self, entity: Entity, component: Type[C]) -> Optional[C]:
-        if entity not in self.entities or component not in self.entities[entity]:
-            return None
-        return self.entities[entity][component]
+        return self.storage.get(entity, component)
 
     # ---- Processor Functions ---- #
-    def add_processor(self, processor: Type[Processor], priority=0) -> None:
-        self.processors.append(processor(priority=priority, world=self))
+    def add_processor(self, processor: Type[Processor], priority=0, **config) -> None:
+        """Any extra keyword arguments are passed on to the processor as configuration"""
+        self.processors.append(processor(priority=priority, world=self, **config))
         # Sort by priority high -> low
         self.processors.sort(key=lambda p: p.priority, reverse=True)
+        self._stages = None
 
     def remove_processor(self, processor: Type[Processor]) -> None:
         self.processors = [p for p in self.processors if not isinstance(p, processor)]
+        self._stages = None
 
     def get_processor(self, processor: Type[Processor]) -> Optional[Processor]:
         for proc in self.processors: